@@ -9,41 +9,79 @@ class ALMAIndicator(IndicatorMixin):
             self,
             close: pd.Series,
             window,
+            offset: float = 0.85,
+            sigma: float = 6,
             fillna: bool = False):
         self._close = close
         self._window = window
-        self._offset = 0.85
-        self._sigma = 6
+        self._offset = offset
+        self._sigma = sigma
         self._fillna = fillna
         self._alma_weights = self.alma_weights(window, self._offset, self._sigma)
         self._run()
 
     def _run(self):
-        if self._window > 1000000:
-            self._alma = self.calculate_alma_large(self._close.values, self._alma_weights, self._window)
-        else:
-            self._alma = self.calculate_alma_small(self._close.values, self._alma_weights, self._window)
+        self._alma = self.calculate_alma(self._close.values, self._alma_weights, self._window)
+
     def alma(self) -> pd.Series:
         return pd.Series(self._alma, index=self._close.index, name='alma')
 
+    @staticmethod
+    def calculate_alma(prices: np.ndarray, weights: np.ndarray, window: int) -> np.ndarray:
+        # Weighted moving sum as one direct convolution. The first window - 1 values stay NaN and a NaN
+        # price only spoils the windows that contain it, same as summing every window separately.
+        prices = np.asarray(prices, dtype=np.float64)
+        alma = np.full(prices.shape[0], fill_value=np.nan, dtype=np.float64)
+        if window < 1 or prices.shape[0] < window:
+            return alma
+        alma[window - 1:] = np.convolve(prices, weights[::-1], mode='valid') / np.sum(weights)
+        return alma
+
     @staticmethod
     # @jit(nopython=True)
     def calculate_alma_large(prices: np.ndarray, weights: np.ndarray, window: int) -> np.ndarray:
-        alma = np.full_like(prices, fill_value=np.nan, dtype=np.float64)
-        weights_sum = np.sum(weights)
-        for i in range(window - 1, len(prices)):
-            weighted_sum = np.sum(weights * prices[i - window + 1:i + 1])
-            alma[i] = weighted_sum / weights_sum
-        return alma
+        return ALMAIndicator.calculate_alma(prices, weights, window)
 
     def calculate_alma_small(self, prices: np.ndarray, weights: np.ndarray, window: int) -> np.ndarray:
-        alma = np.full_like(prices, fill_value=np.nan, dtype=np.float64)
-        weights_sum = np.sum(weights)
-        for i in range(window - 1, len(prices)):
-            weighted_sum = np.sum(weights * prices[i - window + 1:i + 1])
-            alma[i] = weighted_sum / weights_sum
-        return alma
+        return self.calculate_alma(prices, weights, window)
+
+    # Parameters of a batch parameter set, with the defaults of __init__
+    BATCH_DEFAULTS = {'offset': 0.85, 'sigma': 6}
+
+    @classmethod
+    def batch(cls, close: pd.Series, params_list) -> pd.DataFrame:
+        """
+        Computes ALMA for every parameter set of the list form used in Indicator_data,
+        e.g. [{'window': 5}, {'window': 9, 'offset': 0.9}], in one call.
+
+        The prices are converted once and parameter sets repeated in the list are computed once.
+        Columns are labelled with batch_label(params), e.g. 'alma_window=5' and 'alma_offset=0.9_window=9'.
+        """
+        prices = np.asarray(close.values, dtype=np.float64)
+        columns = {}
+        computed = {}
+        for params in params_list:
+            label = cls.batch_label(params)
+            settings = {**cls.BATCH_DEFAULTS, **params}
+            if label in columns:
+                if computed[label] != settings:
+                    raise ValueError(f"Parameter sets {computed[label]} and {settings} share the column {label}")
+                continue
+            window = settings['window']
+            weights = cls.alma_weights(window, settings['offset'], settings['sigma'])
+            columns[label] = cls.calculate_alma(prices, weights, window)
+            computed[label] = settings
+        return pd.DataFrame(columns, index=close.index)
 
+    @classmethod
+    def batch_label(cls, params) -> str:
+        """
+        Column label of a parameter set, its key=value pairs in key order, e.g. 'alma_sigma=4_window=5'.
+        """
+        invalid = [key for key in params if key != 'window' and key not in cls.BATCH_DEFAULTS]
+        if invalid or 'window' not in params:
+            raise ValueError(f"Invalid ALMA parameters: {params}. 'window' is required, 'offset' and 'sigma' are optional")
+        return 'alma_' + '_'.join(f'{key}={value}' for key, value in sorted(params.items()))
 
     @staticmethod
     def alma_weights(window, offset=0.85, sigma=6):
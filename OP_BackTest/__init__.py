@@ -1,5 +1,8 @@
 from .core.CreateDB import CreateDB
 from .core.Engine import Engine
 from .core.DataFetch import DataFetcher
+from .core.Sweep import SweepRunner
+from .core.Streaming import StreamingEngine
+from .core.Batch import BatchEngine
 
 from .utlis.log_handler import ThreadSafeLogger
@@ -0,0 +1,243 @@
+import contextlib
+import datetime as dt
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+import duckdb
+import numpy as np
+import pandas as pd
+from Indicators.Alma import ALMAIndicator
+from OP_BackTest.core.CreateDB import CreateDB
+from OP_BackTest.core.DataFetch import DataFetcher
+from OP_BackTest.core.Engine import Engine
+from OP_BackTest.bench.Synthetic import SyntheticChain
+
+# Data sizes, keyword arguments of SyntheticChain
+SIZES = {
+    'small': {'days': 5, 'expiries': 2, 'strikes': 10},
+    'medium': {'days': 20, 'expiries': 2, 'strikes': 20},
+    'large': {'days': 60, 'expiries': 3, 'strikes': 30},
+}
+
+BENCHMARKS = ['create_db', 'fetch_options_data', 'fetch_and_resample_data', 'alma', 'check_conditions',
+              'engine_loop', 'engine_vectorized', 'engine_parquet']
+
+
+def strategy(from_date, to_date):
+    """
+    Two-leg ALMA strategy of 02Strategy_running.py over from_date..to_date, the one the engine benchmarks run.
+    """
+    leg = {
+        'ActionType': 'BUY', 'TotalLot': 50, 'Target': {'Points': 10}, 'Stoploss': {'Points': 10},
+        'EntryConditions': ['( ALMA280 > High )'], 'ExitConditions': ['( ALMA280 < Low )'],
+    }
+    return {
+        'TimeFrame': 3,
+        'EntryTime': '09:21:00',
+        'ExitTime': '15:20:00',
+        'EntryType': 'Close',
+        'ExpiryEntryDate': 7,
+        'ExpiryExitDate': 1,
+        'FromDate': from_date,
+        'ToDate': to_date,
+        'ExpiryType': 'WEEKLY',
+        'Indicator_data': {'ALMA280': [ALMAIndicator, ['Close'], [{'window': 5}], ['alma']]},
+        'Legs': [
+            {'LegName': 'LegCE', 'OptionType': 'CE', 'StrikePrice': {'greaterthan': 140}, **leg},
+            {'LegName': 'LegPE', 'OptionType': 'PE', 'StrikePrice': {'greaterthan': 140}, **leg},
+        ],
+    }
+
+
+def _measure(function, repeat):
+    # Wall-clock seconds of each call
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def environment():
+    """
+    Versions and machine details stored with the results, so that runs of different machines are told apart.
+    """
+    return {
+        'timestamp': dt.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'duckdb': duckdb.__version__,
+    }
+
+
+class BenchmarkSuite:
+    """
+    Times the main stages of a backtest on synthetic data, see SyntheticChain.
+
+    For every size the chain is generated into CSV files once, then each benchmark is run `repeat` times:
+    CreateDB ingestion of the files, DataFetcher.fetch_options_data for the chain of one day and for the
+    3-minute bars of one ticker, fetch_and_resample_data of those minutes, ALMAIndicator and
+    Engine.check_conditions over the index minutes, and a full Engine.run in loop and vectorized mode.
+    engine_parquet times the vectorized run on the data written with CreateDB(storage='parquet'), after
+    checking that it gives the trade book of the database with the installed DuckDB.
+
+    Attributes:
+    -----------
+    sizes : list
+        Names of SIZES to run, or SyntheticChain keyword dicts keyed by a name of your own.
+    repeat : int
+        Runs of every benchmark, the results hold each time and their min / median.
+    benchmarks : list
+        Subset of BENCHMARKS to run, all by default. The database is always built.
+    work_dir : str
+        Folder for the generated files, a temporary folder removed afterwards by default.
+    """
+
+    def __init__(self, sizes=('small', 'medium'), repeat=3, benchmarks=None, work_dir=None, seed=0):
+        self.sizes = {size: SIZES[size] for size in sizes} if not isinstance(sizes, dict) else dict(sizes)
+        self.repeat = repeat
+        self.benchmarks = list(BENCHMARKS if benchmarks is None else benchmarks)
+        invalid = [benchmark for benchmark in self.benchmarks if benchmark not in BENCHMARKS]
+        if invalid:
+            raise ValueError(f"Invalid benchmarks: {invalid}. Allowed values are: {BENCHMARKS}")
+        self.work_dir = work_dir
+        self.seed = seed
+
+    def _create_db(self, folder, db_path):
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            CreateDB(folder, db_path).run()
+
+    def _parquet_engine(self, folder, db_path, work_dir, name, parameters, log_path):
+        # Vectorized run on a Parquet dataset of the same files. Index rows without an expiry are
+        # partitioned differently by DuckDB versions, so the trades are first checked against the database
+        dataset = os.path.join(work_dir, f'{name}_parquet')
+        shutil.rmtree(dataset, ignore_errors=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            CreateDB(folder, dataset, storage='parquet').run()
+        run_engine = lambda path: Engine(parameters, db_path=path, log_path=log_path, mode='vectorized', executor='serial').run()
+        expected, trade_book = run_engine(db_path), run_engine(dataset)
+        if not trade_book.reset_index(drop=True).equals(expected.reset_index(drop=True)):
+            raise ValueError(f"Trades on the Parquet dataset differ from the database with duckdb {duckdb.__version__}")
+        return lambda: run_engine(dataset)
+
+    def _size(self, name, chain_parameters, work_dir):
+        folder = os.path.join(work_dir, name)
+        db_path = os.path.join(work_dir, f'{name}.db')
+        chain = SyntheticChain(seed=self.seed, **chain_parameters)
+        rows = chain.write(folder)
+        sessions = chain.sessions()
+        from_date, to_date = str(sessions[0].date()), str(sessions[-1].date())
+
+        timings = {}
+        # The database is built even when create_db is not timed, the other benchmarks read it
+        creation = _measure(lambda: self._create_db(folder, db_path), self.repeat if 'create_db' in self.benchmarks else 1)
+        if 'create_db' in self.benchmarks:
+            timings['create_db'] = creation
+
+        Data = DataFetcher(db_path=db_path)
+        day = str(sessions[min(1, len(sessions) - 1)].date())
+        chain_conditions = {'FromDate': day, 'ToDate': f'{day} 23:59:59', 'Type': 'CE'}
+        ticker = Data.fetch_options_data(chain_conditions, columns=['Ticker'])['Ticker'].iloc[0]
+        minutes = Data.fetch_options_data({'Ticker': ticker})
+        index = Data.fetch_options_data({'Ticker': 'NIFTY'})
+        log_path = os.path.join(work_dir, '')
+        engine = Engine(strategy(from_date, to_date), db_path=db_path, log_path=log_path)
+        index_with_alma = index.assign(ALMA280=ALMAIndicator(index['Close'], window=5).alma())
+
+        benchmarks = {
+            'fetch_options_data': lambda: (Data.fetch_options_data(chain_conditions),
+                                           Data.fetch_options_data({'Ticker': ticker}, resample_period='3min')),
+            'fetch_and_resample_data': lambda: Data.fetch_and_resample_data(minutes, '3min'),
+            'alma': lambda: ALMAIndicator(index['Close'], window=280).alma(),
+            'check_conditions': lambda: engine.check_conditions(index_with_alma, ['( ALMA280 > High )', 'Close > Close_2']),
+        }
+        for mode in ('loop', 'vectorized'):
+            def run_engine(mode=mode):
+                # Fresh engine and indicator cache, a run measures its own fetches
+                return Engine(strategy(from_date, to_date), db_path=db_path, log_path=log_path, mode=mode).run()
+            benchmarks[f'engine_{mode}'] = run_engine
+        if 'engine_parquet' in self.benchmarks:
+            benchmarks['engine_parquet'] = self._parquet_engine(folder, db_path, work_dir, name, strategy(from_date, to_date), log_path)
+
+        for benchmark, function in benchmarks.items():
+            if benchmark in self.benchmarks:
+                timings[benchmark] = _measure(function, self.repeat)
+
+        return [{
+            'size': name,
+            'rows': rows,
+            'days': len(sessions),
+            'benchmark': benchmark,
+            'seconds': seconds,
+            'min': min(seconds),
+            'median': statistics.median(seconds),
+        } for benchmark, seconds in timings.items()]
+
+    def run(self):
+        """
+        Runs every benchmark on every size.
+
+        Returns:
+        --------
+        dict
+            {'environment': environment(), 'repeat': ..., 'results': [one row per size and benchmark]}
+        """
+        work_dir = self.work_dir
+        created = None
+        if work_dir is None:
+            work_dir = created = tempfile.mkdtemp(prefix='bench_')
+        os.makedirs(work_dir, exist_ok=True)
+        try:
+            results = []
+            for name, chain_parameters in self.sizes.items():
+                results.extend(self._size(name, chain_parameters, work_dir))
+        finally:
+            if created is not None:
+                shutil.rmtree(created, ignore_errors=True)
+        return {'environment': environment(), 'repeat': self.repeat, 'results': results}
+
+
+def save(report, path):
+    """
+    Writes a report returned by BenchmarkSuite.run as JSON.
+    """
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+    return path
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(baseline, current):
+    """
+    Median times of two reports (dicts or JSON paths) side by side.
+
+    Returns:
+    --------
+    pd.DataFrame
+        One row per size and benchmark found in both, with the baseline and current medians and
+        Ratio = current / baseline, above 1 for a slowdown.
+    """
+    frames = []
+    for report, label in ((baseline, 'Baseline'), (current, 'Current')):
+        report = load(report) if isinstance(report, (str, os.PathLike)) else report
+        frame = pd.DataFrame(report['results'])[['size', 'benchmark', 'median']]
+        frames.append(frame.rename(columns={'median': label}))
+    table = frames[0].merge(frames[1], on=['size', 'benchmark'])
+    table['Ratio'] = table['Current'] / table['Baseline']
+    return table
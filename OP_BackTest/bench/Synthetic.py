@@ -0,0 +1,160 @@
+import pathlib
+import numpy as np
+import pandas as pd
+
+# Column order of the CSV files read by CreateDB
+CSV_HEADER = ['DateTime', 'Open', 'High', 'Low', 'Close', 'Volume', 'OI', 'Underlying', 'Ticker', 'Expiry',
+              'Strike', 'Type', 'Date', 'Weekday']
+
+MINUTES_PER_SESSION = 375
+
+
+def _norm_cdf(x):
+    # Standard normal CDF from the Abramowitz-Stegun erf approximation (error below 1.5e-7), NumPy has no erf
+    z = np.abs(x) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-z * z)
+    return 0.5 * (1.0 + np.sign(x) * erf)
+
+
+def black_scholes(spot, strike, years, volatility, option_type, rate=0.07):
+    """
+    Black-Scholes premium of a European call ('CE') or put ('PE'), vectorized over spot and years.
+    """
+    years = np.maximum(years, 1e-6)
+    sigma = volatility * np.sqrt(years)
+    d1 = (np.log(spot / strike) + (rate + 0.5 * volatility ** 2) * years) / sigma
+    d2 = d1 - sigma
+    discount = strike * np.exp(-rate * years)
+    if option_type == 'CE':
+        return spot * _norm_cdf(d1) - discount * _norm_cdf(d2)
+    return discount * _norm_cdf(-d2) - spot * _norm_cdf(-d1)
+
+
+class SyntheticChain:
+    """
+    Generator of NIFTY index and weekly option-chain minute data in the CSV layout read by CreateDB.
+
+    The index follows a geometric random walk over 375 minutes (09:15 - 15:29) per business day. Each day
+    lists the `expiries` nearest weekly expiries (Thursdays) and `strikes` strikes on each side of the
+    at-the-money strike of the open, all priced with Black-Scholes at a noisy implied volatility. Tickers
+    look like NIFTY08FEB2422000CE. The output is deterministic for a given seed.
+
+    Attributes:
+    -----------
+    from_date : str
+        First day generated.
+    days : int
+        Number of business days.
+    expiries : int
+        Weekly expiries listed on each day.
+    strikes : int
+        Strikes on each side of the at-the-money strike, per expiry and option type.
+    strike_step : int
+        Distance between two strikes.
+    spot : float
+        Index level at the first open.
+    volatility : float
+        Annualised volatility of the index and base implied volatility of the options.
+    seed : int
+        Seed of the random generator.
+    """
+
+    def __init__(self, from_date='2024-01-01', days=5, expiries=2, strikes=10, strike_step=50, spot=22000.0,
+                 volatility=0.15, seed=0):
+        if days < 1 or expiries < 1 or strikes < 0:
+            raise ValueError("days and expiries must be at least 1, strikes at least 0")
+        self.from_date = from_date
+        self.days = days
+        self.expiries = expiries
+        self.strikes = strikes
+        self.strike_step = strike_step
+        self.spot = spot
+        self.volatility = volatility
+        self.seed = seed
+
+    def sessions(self):
+        return pd.bdate_range(self.from_date, periods=self.days)
+
+    def expiry_dates(self, day):
+        # The next `expiries` Thursdays on or after day
+        first = day + pd.Timedelta(days=(3 - day.weekday()) % 7)
+        return [first + pd.Timedelta(weeks=week) for week in range(self.expiries)]
+
+    @staticmethod
+    def ticker(expiry, strike, option_type):
+        return f"NIFTY{expiry.strftime('%d%b%y').upper()}{int(strike)}{option_type}"
+
+    def _day(self, day, spot, rng):
+        minutes = pd.date_range(day + pd.Timedelta('09:15:00'), periods=MINUTES_PER_SESSION, freq='1min')
+        step = self.volatility / np.sqrt(252 * MINUTES_PER_SESSION)
+        path = spot * np.exp(np.cumsum(rng.normal(0.0, step, MINUTES_PER_SESSION)))
+        frames = [self._bars(minutes, path, rng, 'NIFTY', 'NIFTY', pd.NaT, np.nan, 'nan', day, volume=False)]
+
+        atm = round(path[0] / self.strike_step) * self.strike_step
+        strikes = atm + self.strike_step * np.arange(-self.strikes, self.strikes + 1)
+        for expiry in self.expiry_dates(day):
+            # Years to the 15:30 close of the expiry day
+            years = ((expiry + pd.Timedelta('15:30:00')) - minutes).total_seconds().to_numpy() / (365 * 24 * 3600)
+            for strike in strikes:
+                for option_type in ('CE', 'PE'):
+                    # Volatility smile around the money, with some noise per contract
+                    volatility = self.volatility * (1 + abs(np.log(strike / path[0]))) * rng.uniform(0.95, 1.05)
+                    premium = np.maximum(np.round(black_scholes(path, strike, years, volatility, option_type), 2), 0.05)
+                    frames.append(self._bars(minutes, premium, rng, 'NIFTY', self.ticker(expiry, strike, option_type),
+                                             expiry, float(strike), option_type, day))
+        return pd.concat(frames, ignore_index=True), path[-1]
+
+    @staticmethod
+    def _bars(minutes, close, rng, underlying, ticker, expiry, strike, option_type, day, volume=True):
+        # OHLC bars around a close series, the open being the previous close. Options move about 1% within
+        # a minute, the index a few points.
+        count = close.shape[0]
+        open_ = np.r_[close[0], close[:-1]]
+        spread = np.abs(close) * (0.01 if volume else 0.0003)
+        high = np.maximum(open_, close) + rng.uniform(0, 1, count) * spread
+        low = np.maximum(np.minimum(open_, close) - rng.uniform(0, 1, count) * spread, 0.05 if volume else 0.0)
+        return pd.DataFrame({
+            'DateTime': minutes,
+            'Open': np.round(open_, 2),
+            'High': np.round(high, 2),
+            'Low': np.round(low, 2),
+            'Close': np.round(close, 2),
+            'Volume': rng.integers(0, 5000, count) * 25 if volume else np.zeros(count, dtype=np.int64),
+            'OI': np.cumsum(rng.integers(0, 500, count)) * 25 if volume else np.zeros(count, dtype=np.int64),
+            'Underlying': underlying,
+            'Ticker': ticker,
+            'Expiry': expiry,
+            'Strike': strike,
+            'Type': option_type,
+            'Date': day,
+            'Weekday': day.weekday(),
+        }, columns=CSV_HEADER)
+
+    def frames(self):
+        """
+        Yields (day, DataFrame) for every session, the rows of one CSV file.
+        """
+        rng = np.random.default_rng(self.seed)
+        spot = self.spot
+        for day in self.sessions():
+            frame, spot = self._day(day, spot, rng)
+            yield day, frame
+
+    def write(self, data_folder):
+        """
+        Writes one CSV file per session into data_folder, e.g. NIFTY_2024-01-01.csv.
+
+        Returns:
+        --------
+        int
+            Number of rows written.
+        """
+        data_folder = pathlib.Path(data_folder)
+        data_folder.mkdir(parents=True, exist_ok=True)
+        rows = 0
+        for day, frame in self.frames():
+            frame.to_csv(data_folder / f"NIFTY_{day.strftime('%Y-%m-%d')}.csv", index=False)
+            rows += frame.shape[0]
+        return rows
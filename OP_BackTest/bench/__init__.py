@@ -0,0 +1,2 @@
+from .Synthetic import SyntheticChain
+from .Suite import BenchmarkSuite, compare
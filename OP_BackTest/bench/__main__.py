@@ -0,0 +1,19 @@
+import argparse
+from OP_BackTest.bench.Suite import BENCHMARKS, SIZES, BenchmarkSuite, compare, save
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m OP_BackTest.bench', description='Benchmarks the backtest on synthetic data.')
+    parser.add_argument('--sizes', nargs='+', default=['small', 'medium'], choices=list(SIZES))
+    parser.add_argument('--benchmarks', nargs='+', default=None, choices=BENCHMARKS)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='bench.json', help='JSON file the results are written to')
+    parser.add_argument('--baseline', default=None, help='JSON file of an earlier run to compare with')
+    parser.add_argument('--work-dir', default=None, help='Folder for the generated data, temporary by default')
+    args = parser.parse_args()
+
+    report = BenchmarkSuite(sizes=args.sizes, repeat=args.repeat, benchmarks=args.benchmarks, work_dir=args.work_dir).run()
+    save(report, args.output)
+    for row in report['results']:
+        print(f"{row['size']:<8} {row['benchmark']:<24} {row['rows']:>10} rows  median {row['median']:.4f}s  min {row['min']:.4f}s")
+    if args.baseline:
+        print(compare(args.baseline, report).to_string(index=False))
@@ -0,0 +1,63 @@
+import os
+import threading
+import pyarrow as pa
+
+# Tables opened by this process, keyed by path. The pages are memory-mapped, so processes reading
+# the same file share them through the OS page cache instead of each holding a copy.
+_tables = {}
+_lock = threading.Lock()
+
+
+def export_table(conn, path, query="SELECT * FROM data ORDER BY Ticker, DateTime", rows_per_batch=1_000_000, params=None):
+    """
+    Writes the result of query to an Arrow IPC file, streaming it batch by batch.
+
+    Parameters:
+    -----------
+    conn : duckdb.DuckDBPyConnection
+        Connection to read from.
+    path : str
+        Destination file, conventionally with an `.arrow` suffix so DataFetcher recognises it.
+    query : str
+        Query selecting the rows to export, the whole data table by default.
+    params : list
+        Parameters of query.
+
+    Returns:
+    --------
+    str
+        path
+    """
+    reader = conn.execute(query, params or []).fetch_record_batch(rows_per_batch)
+    tmp_path = f'{path}.tmp'
+    with pa.OSFile(str(tmp_path), 'wb') as sink:
+        with pa.ipc.new_file(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+    os.replace(tmp_path, path)
+    return path
+
+
+def open_table(path):
+    """
+    Memory-maps an Arrow IPC file written by export_table. Zero-copy and opened once per process.
+    """
+    key = os.path.abspath(str(path))
+    with _lock:
+        table = _tables.get(key)
+        if table is None:
+            table = pa.ipc.open_file(pa.memory_map(key, 'r')).read_all()
+            _tables[key] = table
+        return table
+
+
+def close_table(path):
+    """
+    Forgets a table opened by open_table, its memory map is released once no query uses it.
+    """
+    with _lock:
+        _tables.pop(os.path.abspath(str(path)), None)
+
+
+def is_arrow_path(path):
+    return str(path).endswith('.arrow')
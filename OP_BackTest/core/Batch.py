@@ -0,0 +1,211 @@
+import os
+import shutil
+import tempfile
+import threading
+import pandas as pd
+from OP_BackTest.core.ArrowStore import close_table, export_table
+from OP_BackTest.core.ConnectionPool import ConnectionPool
+from OP_BackTest.core.DataFetch import DataFetcher
+from OP_BackTest.core.Engine import Engine
+from OP_BackTest.core.IndicatorCache import IndicatorCache
+from OP_BackTest.core.Profiler import NULL_PROFILER
+from OP_BackTest.core.Vectorized import VectorizedLeg
+from OP_BackTest.utlis import log_handler
+
+
+def chain_union(conditions):
+    """
+    fetch_options_data conditions matching every row matched by any of the given chain conditions
+    (Engine.data_fetch_para with a 'Type'): the widest date range, daily window and days to expiry.
+    """
+    times = lambda key: [pd.to_datetime(condition[key]).time() for condition in conditions]
+    union = {
+        'FromDate': str(min(pd.to_datetime(condition['FromDate']) for condition in conditions)),
+        'ToDate': str(max(pd.to_datetime(condition['ToDate']) for condition in conditions)),
+        'EveryDayStartTime': str(min(times('EveryDayStartTime'))),
+        'EveryDayEndTime': str(max(times('EveryDayEndTime'))),
+        'StartDaysBeforeExpiry': max(condition['StartDaysBeforeExpiry'] for condition in conditions),
+        'EndDaysBeforeExpiry': min(condition['EndDaysBeforeExpiry'] for condition in conditions),
+    }
+    types = {condition['Type'] for condition in conditions}
+    if len(types) == 1:
+        union['Type'] = types.pop()
+    return union
+
+
+class ChainStore:
+    """
+    Option chain rows of a batch of strategies, exported once from the database to a memory-mapped
+    Arrow file (see ArrowStore) and queried from there.
+
+    Strike selection of every leg filters its own rows out of this subset with the usual DataFetcher
+    queries, so the picks are the same as on the database. Picks are kept, legs with the same chain
+    conditions and strike rule pick once.
+
+    Attributes:
+    -----------
+    path : str
+        Arrow file of the rows.
+    Data : DataFetcher
+        Fetcher reading the Arrow file.
+    """
+
+    def __init__(self, Data, conditions, path, chain_cache_days=5):
+        self.path = path
+        where_conditions, params = Data._build_where(conditions)
+        with Data.profiler.stage('query'):
+            export_table(Data.conn, path, f"SELECT * FROM data WHERE {' AND '.join(where_conditions)} ORDER BY DateTime",
+                         params=params)
+        # A pool of its own, the leg threads query the file through their own cursors
+        self._pool = ConnectionPool()
+        self.Data = DataFetcher(db_path=path, chain_cache_days=chain_cache_days, pool=self._pool, profiler=Data.profiler)
+        self._strikes = {}
+        self._lock = threading.Lock()
+
+    def fetch_strikes_batch(self, conditions, rule, value, column='Close', entry_times=None):
+        """
+        Same as DataFetcher.fetch_strikes_batch, computed once per set of arguments.
+        """
+        key = (tuple(sorted((key, str(condition)) for key, condition in conditions.items())), rule, str(value), column,
+               None if entry_times is None else tuple(entry_times))
+        with self._lock:
+            picked = self._strikes.get(key)
+        if picked is None:
+            picked = self.Data.fetch_strikes_batch(conditions, rule, value, column=column, entry_times=entry_times)
+            with self._lock:
+                self._strikes[key] = picked
+        return picked
+
+    def fetch_chain_snapshot(self, conditions, columns=None):
+        return self.Data.fetch_chain_snapshot(conditions, columns=columns)
+
+    def close(self):
+        self._pool.close()
+        close_table(self.path)
+
+
+class BatchEngine:
+    """
+    Runs many strategies over the same data with one scan of the market data.
+
+    Separate Engine runs each query the option chain for the strikes of every leg, and resample the
+    tickers and compute the indicators again. BatchEngine works out what the strategies need together
+    before running any of them:
+
+        - the chain rows of all legs (widest date range, daily window and days to expiry, see chain_union)
+          are exported once into a ChainStore, which every leg picks its strikes from;
+        - the tickers picked at any minute by any leg are fetched and resampled with one query per
+          TimeFrame into the shared IndicatorCache;
+        - indicator columns are cached by ticker, TimeFrame, indicator class and parameters, so an
+          indicator used by several strategies is computed once.
+
+    The strategies then run one after the other, legs in threads, on that shared data, and return the
+    same trade books as separate Engine runs.
+
+    Attributes:
+    -----------
+    strategies : dict
+        Name to Strategy_parameters. A list is named Strategy0, Strategy1, ...
+    db_path : str
+        Database of every strategy, see Engine.
+    mode : str
+        Engine mode of every strategy, 'vectorized' by default.
+    indicator_cache : IndicatorCache
+        Cache shared by the strategies. Size it to hold the tickers of the batch, evicted tickers are
+        fetched again when a strategy reaches them.
+    work_dir : str
+        Folder of the ChainStore file, a temporary folder removed afterwards by default.
+    engines : dict
+        Name to Engine, created with the BatchEngine.
+    """
+
+    def __init__(self, strategies, db_path=None, log_path=None, mode='vectorized', indicator_cache=None, pool=None,
+                 profiler=None, work_dir=None):
+        if not isinstance(strategies, dict):
+            strategies = {f'Strategy{number}': parameters for number, parameters in enumerate(strategies)}
+        self.strategies = strategies
+        self.db_path = '../DataDB/data.db' if db_path is None else db_path
+        self.mode = mode
+        self.indicator_cache = IndicatorCache() if indicator_cache is None else indicator_cache
+        # None opens the database for each run and closes it afterwards, see Engine.pool
+        self.pool = pool
+        self.profiler = NULL_PROFILER if profiler is None else profiler
+        self.work_dir = work_dir
+        self.engines = {name: Engine(parameters, db_path=self.db_path, log_path=log_path, mode=mode,
+                                     indicator_cache=self.indicator_cache, pool=self.pool, profiler=self.profiler)
+                        for name, parameters in strategies.items()}
+
+        log_path = "Engine.log" if log_path is None else log_path + "Engine.log"
+        self.logger = log_handler.ThreadSafeLogger("Engine", log_path).get_logger()
+
+    def prefetch(self, work_dir):
+        """
+        Exports the chain of all legs into a ChainStore in work_dir and loads every ticker they pick.
+
+        Returns:
+        --------
+        ChainStore
+            Store the engines pick their strikes from, to be closed after the run.
+        """
+        legs = [(engine, leg) for engine in self.engines.values() for leg in engine.legs]
+        if not legs:
+            return None
+        Data = DataFetcher(db_path=self.db_path, pool=self.pool or None, profiler=self.profiler)
+        with self.profiler.stage('prefetch') as stage:
+            conditions = [dict(engine.data_fetch_para(), Type=leg['OptionType']) for engine, leg in legs]
+            max_legs = max(len(engine.legs) for engine in self.engines.values())
+            chain = ChainStore(Data, chain_union(conditions), os.path.join(work_dir, 'chain.arrow'),
+                               chain_cache_days=5 * max_legs)
+            for engine in self.engines.values():
+                engine.chain_source = chain
+
+            tickers = {}
+            for engine, leg in legs:
+                picked = VectorizedLeg(engine, leg, Data).select_strikes()
+                tickers.setdefault(engine.TimeFrame, {}).update(dict.fromkeys(picked.values()))
+            for time_frame, names in tickers.items():
+                self.indicator_cache.prefetch(Data, list(names), time_frame)
+            ticker_count = stage.rows = sum(len(names) for names in tickers.values())
+        self.logger.info(f'Batch prefetch: {len(legs)} legs, {ticker_count} tickers')
+        return chain
+
+    def run(self):
+        """
+        Runs every strategy.
+
+        Returns:
+        --------
+        dict
+            Name to the trade book returned by Engine.run.
+        """
+        work_dir = self.work_dir
+        created = None
+        if work_dir is None:
+            work_dir = created = tempfile.mkdtemp(prefix='batch_')
+        os.makedirs(work_dir, exist_ok=True)
+        chain = None
+        created_pool = self.pool is None
+        if created_pool:
+            # One handle for the prefetch and every strategy of the run
+            self.pool = ConnectionPool()
+            for engine in self.engines.values():
+                engine.pool = self.pool
+        try:
+            chain = self.prefetch(work_dir)
+            results = {}
+            for name, engine in self.engines.items():
+                self.logger.info(f'Batch strategy {name}')
+                results[name] = engine.run()
+        finally:
+            for engine in self.engines.values():
+                engine.chain_source = None
+            if chain is not None:
+                chain.close()
+            if created_pool:
+                self.pool.close()
+                self.pool = None
+                for engine in self.engines.values():
+                    engine.pool = None
+            if created is not None:
+                shutil.rmtree(created, ignore_errors=True)
+        return results
@@ -0,0 +1,89 @@
+import datetime as dt
+import numpy as np
+import pandas as pd
+
+
+class TradingCalendar:
+    """
+    Trading sessions and the NIFTY minute spine of the data table, loaded once.
+
+    Replaces per-day probing with `SELECT DISTINCT CAST(DateTime AS DATE)` scans. Session lookups are
+    O(1) (membership) or O(log n) (next / previous / shift), minute lookups are binary searches over
+    the sorted spine.
+
+    Attributes:
+    -----------
+    sessions : np.ndarray
+        Sorted trading dates (datetime64[D]) having any row in the data table.
+    minutes : np.ndarray
+        Sorted distinct DateTime values of the NIFTY index rows, the resampling spine.
+    """
+
+    def __init__(self, sessions, minutes):
+        self.sessions = np.asarray(sessions, dtype='datetime64[D]')
+        self.minutes = np.asarray(minutes)
+        self._session_set = set(self.sessions.tolist())
+
+    @classmethod
+    def from_connection(cls, conn, table='data'):
+        """
+        Builds the calendar with a single scan of the table.
+        """
+        query = f"""
+                SELECT DateTime, bool_or(Ticker = 'NIFTY') AS Spine
+                FROM {table}
+                GROUP BY DateTime
+                ORDER BY DateTime
+            """
+        rows = conn.execute(query).fetch_df()
+        date_times = rows['DateTime'].to_numpy()
+        sessions = np.unique(date_times.astype('datetime64[D]'))
+        return cls(sessions, date_times[rows['Spine'].fillna(False).to_numpy(dtype=bool)])
+
+    @staticmethod
+    def _day(date):
+        return np.datetime64(pd.to_datetime(date).date(), 'D')
+
+    @staticmethod
+    def _to_date(day):
+        return day.astype('datetime64[D]').astype(dt.date)
+
+    def is_session(self, date):
+        return self._day(date).astype(dt.date) in self._session_set
+
+    def next_session(self, date):
+        """
+        First trading date strictly after date, None when the data ends before.
+        """
+        position = np.searchsorted(self.sessions, self._day(date), side='right')
+        return self._to_date(self.sessions[position]) if position < self.sessions.shape[0] else None
+
+    def previous_session(self, date):
+        """
+        Last trading date strictly before date, None when the data starts after.
+        """
+        position = np.searchsorted(self.sessions, self._day(date), side='left') - 1
+        return self._to_date(self.sessions[position]) if position >= 0 else None
+
+    def shift_session(self, date, sessions):
+        """
+        Trading date `sessions` sessions away from date (negative to go back), None when out of range.
+
+        date does not need to be a session itself, it is counted from the session it falls on or before.
+        """
+        position = np.searchsorted(self.sessions, self._day(date), side='right') - 1
+        target = position + sessions
+        if target < 0 or target >= self.sessions.shape[0]:
+            return None
+        return self._to_date(self.sessions[target])
+
+    def session_minutes(self, from_date=None, to_date=None):
+        """
+        Spine minutes between from_date and to_date, both inclusive.
+
+        Returns:
+            DataFrame with a single DateTime column, same as the spine query it replaces.
+        """
+        start = 0 if from_date is None else np.searchsorted(self.minutes, np.datetime64(pd.to_datetime(from_date)), side='left')
+        stop = self.minutes.shape[0] if to_date is None else np.searchsorted(self.minutes, np.datetime64(pd.to_datetime(to_date)), side='right')
+        return pd.DataFrame({'DateTime': self.minutes[start:stop]})
@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+
+class ChainSnapshot:
+    """
+    One trading day of the option chain, indexed by DateTime.
+
+    The frame is kept in the order returned by the query (DateTime, Type, Open), so the rows of one
+    minute are contiguous and a cross-section is a slice located with two binary searches.
+    """
+
+    def __init__(self, data):
+        self.data = data.reset_index(drop=True)
+        self.times = self.data['DateTime'].to_numpy() if not self.data.empty else np.array([], dtype='datetime64[ns]')
+
+    def at(self, date_time):
+        """
+        Returns the cross-section of the chain at date_time, same as a fetch with 'DateTime' = date_time.
+        """
+        date_time = np.datetime64(pd.to_datetime(date_time))
+        start = np.searchsorted(self.times, date_time, side='left')
+        stop = np.searchsorted(self.times, date_time, side='right')
+        return self.data.iloc[start:stop].reset_index(drop=True)
+
+    @property
+    def nbytes(self):
+        return int(self.data.memory_usage(deep=False).sum())
+
+
+class ChainSnapshotCache:
+    """
+    Bounded LRU cache of ChainSnapshot objects, one entry per trading day and chain filter.
+
+    Attributes:
+    -----------
+    max_days : int
+        Maximum number of day snapshots kept in memory. The least recently used day is evicted first.
+    hits : int
+        Number of lookups served from memory.
+    misses : int
+        Number of lookups which needed a query.
+    """
+
+    def __init__(self, max_days=5):
+        if max_days < 1:
+            raise ValueError("max_days must be at least 1")
+        self.max_days = max_days
+        self.hits = 0
+        self.misses = 0
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is None:
+                self.misses += 1
+                return None
+            self._snapshots.move_to_end(key)
+            self.hits += 1
+            return snapshot
+
+    def put(self, key, snapshot):
+        with self._lock:
+            self._snapshots[key] = snapshot
+            self._snapshots.move_to_end(key)
+            while len(self._snapshots) > self.max_days:
+                self._snapshots.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+
+    def __len__(self):
+        return len(self._snapshots)
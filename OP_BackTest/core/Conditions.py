@@ -0,0 +1,211 @@
+import ast
+import re
+import numpy as np
+
+
+def _length(data):
+    # Number of rows of a DataFrame or of a dict of column arrays
+    if hasattr(data, 'iloc'):
+        return len(data)
+    return len(next(iter(data.values()))) if data else 0
+
+
+class ConditionError(ValueError):
+    """
+    Raised when an entry or exit condition cannot be parsed or references unknown columns.
+    """
+
+
+class CompiledCondition:
+    """
+    One condition string, e.g. '( ALMA280 > High )' or 'Close > Close_2', parsed once into a NumPy evaluator.
+
+    Conditions use Python syntax. `and`, `or`, `not` (or `&`, `|`, `~`) combine comparisons with the
+    precedence pandas.eval gives them, `Column_N` is `Column` shifted by N bars.
+
+    Attributes:
+    -----------
+    source : str
+        The condition as written in the strategy.
+    columns : set
+        Columns the condition reads.
+    shifts : dict
+        Column name to the set of shifts the condition reads, 0 for the unshifted column.
+    max_shift : int
+        Largest shift used, the number of earlier bars needed to evaluate a row.
+    """
+
+    _compare_operators = {
+        ast.Gt: '>', ast.GtE: '>=', ast.Lt: '<', ast.LtE: '<=', ast.Eq: '==', ast.NotEq: '!=',
+    }
+    _binary_operators = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+    _shift_pattern = re.compile(r'^(.+)_(\d+)$')
+
+    def __init__(self, condition, columns):
+        self.source = condition
+        self.shifts = {}
+        self._variables = {}
+        self._known_columns = list(columns)
+        expression = condition.replace('&', ' and ').replace('|', ' or ').replace('~', ' not ')
+        try:
+            tree = ast.parse(expression.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ConditionError(f"Invalid condition {condition!r}: {e.msg}") from None
+        body = self._transform(tree.body)
+        self._code = compile(ast.fix_missing_locations(ast.Expression(body)), f'<condition {condition!r}>', 'eval')
+
+    @property
+    def columns(self):
+        return set(self.shifts)
+
+    @property
+    def max_shift(self):
+        return max((shift for shifts in self.shifts.values() for shift in shifts), default=0)
+
+    def _variable(self, column, shift):
+        self.shifts.setdefault(column, set()).add(shift)
+        name = self._variables.setdefault((column, shift), f'_v{len(self._variables)}')
+        return ast.Name(id=name, ctx=ast.Load())
+
+    def _call(self, function, args):
+        return ast.Call(func=ast.Attribute(value=ast.Name(id='np', ctx=ast.Load()), attr=function, ctx=ast.Load()), args=args, keywords=[])
+
+    def _transform(self, node):
+        # Rewrites the parsed condition into NumPy calls over column arrays
+        if isinstance(node, ast.Name):
+            match = self._shift_pattern.match(node.id)
+            # Same resolution order as the column regex it replaces: a known base column with a
+            # `_N` suffix is a shift, otherwise the whole name has to be a column
+            if match and match.group(1) in self._known_columns:
+                return self._variable(match.group(1), int(match.group(2)))
+            if node.id in self._known_columns:
+                return self._variable(node.id, 0)
+            raise ConditionError(f"Unknown column {node.id!r} in condition {self.source!r}. Valid columns are: {self._known_columns}")
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, bool, str)):
+            return node
+        if isinstance(node, ast.BoolOp):
+            function = 'logical_and' if isinstance(node.op, ast.And) else 'logical_or'
+            result = self._transform(node.values[0])
+            for value in node.values[1:]:
+                result = self._call(function, [result, self._transform(value)])
+            return result
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, (ast.Not, ast.Invert)):
+                return self._call('logical_not', [self._transform(node.operand)])
+            if isinstance(node.op, (ast.USub, ast.UAdd)):
+                return ast.UnaryOp(op=node.op, operand=self._transform(node.operand))
+        if isinstance(node, ast.BinOp) and isinstance(node.op, self._binary_operators):
+            return ast.BinOp(left=self._transform(node.left), op=node.op, right=self._transform(node.right))
+        if isinstance(node, ast.Compare) and all(type(op) in self._compare_operators for op in node.ops):
+            operands = [self._transform(node.left)] + [self._transform(value) for value in node.comparators]
+            # a < b < c is (a < b) and (b < c)
+            result = None
+            for left, op, right in zip(operands, node.ops, operands[1:]):
+                comparison = ast.Compare(left=left, ops=[op], comparators=[right])
+                result = comparison if result is None else self._call('logical_and', [result, comparison])
+            return result
+        raise ConditionError(f"Unsupported expression {ast.unparse(node)!r} in condition {self.source!r}")
+
+    @staticmethod
+    def _shifted(values, shift):
+        if shift == 0:
+            return values
+        if values.dtype.kind in 'biuf':
+            shifted = np.full(values.shape[0], np.nan, dtype=np.float64)
+        else:
+            shifted = np.full(values.shape[0], None, dtype=object)
+        if shift < values.shape[0]:
+            shifted[shift:] = values[:-shift]
+        return shifted
+
+    def evaluate(self, data):
+        """
+        Evaluates the condition on a DataFrame or a dict of NumPy arrays.
+
+        Returns:
+            Boolean NumPy array, one value per row.
+        """
+        variables = {}
+        length = None
+        for (column, shift), name in self._variables.items():
+            try:
+                values = np.asarray(data[column])
+            except KeyError:
+                raise ConditionError(f"Column {column!r} used in condition {self.source!r} is missing from the data") from None
+            length = values.shape[0]
+            variables[name] = self._shifted(values, shift)
+        with np.errstate(invalid='ignore'):
+            result = eval(self._code, {'np': np, '__builtins__': {}}, variables)
+        result = np.asarray(result, dtype=bool)
+        if result.ndim == 0:
+            result = np.full(length if length is not None else _length(data), bool(result))
+        return result
+
+    def __getstate__(self):
+        # Code objects do not pickle, the condition is compiled again when unpickled
+        return {'source': self.source, 'columns': self._known_columns}
+
+    def __setstate__(self, state):
+        self.__init__(state['source'], state['columns'])
+
+
+class ConditionSet:
+    """
+    Entry or exit conditions of a leg. A row is signalled when any of the conditions holds.
+
+    Attributes:
+    -----------
+    conditions : list
+        CompiledCondition objects, in the order of the strategy.
+    columns : set
+        Columns read by all the conditions.
+    shifts : dict
+        Column name to the set of shifts read by all the conditions.
+    max_shift : int
+        Largest shift used by any condition.
+    empty : bool
+        Signal returned for every row when there are no conditions.
+    """
+
+    def __init__(self, conditions, columns, empty=False):
+        self.conditions = [CompiledCondition(condition, columns) for condition in conditions]
+        self.empty = empty
+        self.shifts = {}
+        for condition in self.conditions:
+            for column, shifts in condition.shifts.items():
+                self.shifts.setdefault(column, set()).update(shifts)
+
+    @property
+    def columns(self):
+        return set(self.shifts)
+
+    @property
+    def max_shift(self):
+        return max((condition.max_shift for condition in self.conditions), default=0)
+
+    def evaluate(self, data, last=False):
+        """
+        Combined signal of the conditions.
+
+        With last=True only the signal of the last row is computed, on the few rows its shifts need.
+        """
+        if last:
+            length = _length(data)
+            if length == 0:
+                raise IndexError("Cannot evaluate the last row of empty data")
+            start = max(length - self.max_shift - 1, 0)
+            if hasattr(data, 'iloc'):
+                data = data.iloc[start:]
+            else:
+                data = {column: np.asarray(values)[start:] for column, values in data.items()}
+            return bool(self.evaluate(data)[-1])
+
+        if not self.conditions:
+            return np.full(_length(data), self.empty)
+        signal = self.conditions[0].evaluate(data)
+        for condition in self.conditions[1:]:
+            signal = signal | condition.evaluate(data)
+        return signal
+
+    def describe(self):
+        return ', '.join(f"{column}{sorted(shifts)}" for column, shifts in sorted(self.shifts.items()))
@@ -0,0 +1,147 @@
+import os
+import pathlib
+import threading
+from collections import OrderedDict
+import duckdb
+
+# Partition column types of a Parquet dataset written by CreateDB(storage='parquet'). ExpiryDate is read as
+# text: the index rows have no expiry, and DuckDB 1.0 names their partition 'ExpiryDate=NULL', which does
+# not cast to DATE. Filters on it use DataFetch.PARTITION_EXPIRY.
+HIVE_TYPES = "{'ExpiryDate': VARCHAR, 'TradeDate': DATE}"
+
+
+def open_database(db_path, columns):
+    """
+    Opens the `data` of db_path on a new connection.
+
+    db_path is a DuckDB file (opened read only), an Arrow IPC file written by ArrowStore.export_table
+    (memory-mapped and registered) or a hive-partitioned Parquet dataset directory written by
+    CreateDB(storage='parquet') (exposed as a view).
+
+    Parameters:
+    -----------
+    db_path : str
+        Database file, Arrow file or dataset directory.
+    columns : list
+        Columns the Parquet view lists first, DataFetch.DATA_COLUMNS.
+
+    Returns:
+    --------
+    tuple
+        (connection, setup, partitioned). setup(cursor) makes `data` visible on a cursor of the
+        connection, registered Arrow tables being local to the connection they were registered on.
+    """
+    if os.path.isdir(str(db_path)):
+        # Hive-partitioned Parquet dataset written by CreateDB(storage='parquet'), read without a file lock
+        conn = duckdb.connect()
+        conn.execute(f"""
+            CREATE VIEW data AS
+            SELECT {', '.join(columns)}, * EXCLUDE ({', '.join(columns)})
+            FROM read_parquet('{pathlib.Path(db_path).as_posix()}/**/*.parquet', hive_partitioning = true,
+                                       hive_types = {HIVE_TYPES})
+        """)
+        return conn, None, True
+    if str(db_path).endswith('.arrow'):
+        # Memory-mapped Arrow export (see ArrowStore), shared between processes without a file lock
+        from OP_BackTest.core.ArrowStore import open_table
+        table = open_table(db_path)
+        conn = duckdb.connect()
+        conn.register('data', table)
+        return conn, lambda cursor: cursor.register('data', table), False
+    return duckdb.connect(database=str(db_path), read_only=True), None, False
+
+
+class ConnectionPool:
+    """
+    Process-wide database handles shared by DataFetcher instances.
+
+    Every database is opened once per process and each thread queries it through its own cursor, so
+    leg threads and concurrent Engine runs share one database instance (buffer pool, metadata, opened
+    files) without opening it again or serialising on a single connection.
+
+    Parsed statements are cached by query text, the shape of a DataFetcher query, and executed with
+    their parameters, so repeated queries skip the SQL parser.
+
+    Attributes:
+    -----------
+    max_statements : int
+        Number of parsed statements kept.
+    """
+
+    def __init__(self, max_statements=256):
+        self.max_statements = max_statements
+        self._databases = {}
+        self._statements = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @staticmethod
+    def key(db_path):
+        return os.path.abspath(str(db_path))
+
+    def database(self, db_path, columns):
+        """
+        Entry of db_path, opened on first use: dict with the connection, the cursor setup, whether it is
+        partitioned, a generation number and `shared`, metadata cached for all DataFetchers of the database.
+        """
+        key = self.key(db_path)
+        with self._lock:
+            database = self._databases.get(key)
+            if database is None:
+                conn, setup, partitioned = open_database(db_path, columns)
+                database = {'conn': conn, 'setup': setup, 'partitioned': partitioned,
+                            'generation': object(), 'shared': {}}
+                self._databases[key] = database
+            return database
+
+    def cursor(self, database):
+        """
+        Cursor of the calling thread on database, created on first use.
+        """
+        cursors = getattr(self._local, 'cursors', None)
+        if cursors is None:
+            cursors = self._local.cursors = {}
+        generation, cursor = cursors.get(id(database['conn']), (None, None))
+        # A database closed and opened again gets a new generation, its old cursors are not reused
+        if generation is not database['generation']:
+            cursor = database['conn'].cursor()
+            if database['setup'] is not None:
+                database['setup'](cursor)
+            cursors[id(database['conn'])] = (database['generation'], cursor)
+        return cursor
+
+    def statement(self, cursor, query):
+        """
+        Parsed statement of query, parsed on first use.
+        """
+        with self._lock:
+            statement = self._statements.get(query)
+            if statement is not None:
+                self._statements.move_to_end(query)
+                return statement
+        statements = cursor.extract_statements(query)
+        if len(statements) != 1:
+            return query
+        with self._lock:
+            self._statements[query] = statements[0]
+            while len(self._statements) > self.max_statements:
+                self._statements.popitem(last=False)
+        return statements[0]
+
+    def close(self, db_path=None):
+        """
+        Closes db_path, or every database, releasing the file lock before the database is written from this
+        or another process. The calendar and table metadata are dropped, reopening reads them again.
+        """
+        with self._lock:
+            keys = list(self._databases) if db_path is None else [self.key(db_path)]
+            for key in keys:
+                database = self._databases.pop(key, None)
+                if database is not None:
+                    # Also emptied for the fetchers still holding the entry
+                    database['shared'].clear()
+                    database['conn'].close()
+
+
+# Pool shared by the Engines given pool=default_pool, one per process. It holds the database open until closed
+default_pool = ConnectionPool()
@@ -1,8 +1,59 @@
 import os
+import re
 import pathlib
+import datetime as dt
 import duckdb
-import pandas as pd
-import numpy as np
+from OP_BackTest.core.ConnectionPool import HIVE_TYPES
+from OP_BackTest.core.Resample import complete_row, resample_query
+
+# CSV layout, in column order. Timestamps are read as text and converted with TRY_CAST so that
+# unparsable values become NULL, numbers are read as DOUBLE so that '12.0' is accepted for INT columns.
+CSV_COLUMNS = {
+    'DateTime': 'VARCHAR', 'Open': 'DOUBLE', 'High': 'DOUBLE', 'Low': 'DOUBLE', 'Close': 'DOUBLE',
+    'Volume': 'DOUBLE', 'OI': 'DOUBLE', 'Underlying': 'VARCHAR', 'Ticker': 'VARCHAR', 'Expiry': 'VARCHAR',
+    'Strike': 'DOUBLE', 'Type': 'VARCHAR', 'Date': 'VARCHAR', 'Weekday': 'DOUBLE',
+}
+
+# Conversion of the CSV columns to the table schema. Missing strings are stored as 'nan' like the
+# pandas based loader did with astype(str).
+CSV_SELECT = """
+    TRY_CAST(DateTime AS TIMESTAMP) AS DateTime,
+    CAST(Open AS FLOAT) AS Open,
+    CAST(High AS FLOAT) AS High,
+    CAST(Low AS FLOAT) AS Low,
+    CAST(Close AS FLOAT) AS Close,
+    CAST(Volume AS INT) AS Volume,
+    CAST(OI AS INT) AS OI,
+    COALESCE(Underlying, 'nan') AS Underlying,
+    COALESCE(Ticker, 'nan') AS Ticker,
+    TRY_CAST(Expiry AS TIMESTAMP) AS Expiry,
+    CAST(Strike AS FLOAT) AS Strike,
+    COALESCE(Type, 'nan') AS Type,
+    TRY_CAST(Date AS TIMESTAMP) AS Date,
+    CAST(Weekday AS INT) AS Weekday
+"""
+
+# Columns derived from DateTime and Expiry, stored so that DataFetcher filters on plain columns which
+# DuckDB prunes with its min/max zone maps. DayOfWeek is DATE_PART('dow'), Sunday = 0, the numbering of
+# the Weekday condition; the Weekday column keeps the numbering of the CSV files.
+DERIVED_SELECT = """
+    CAST(DateTime AS DATE) AS TradeDate,
+    CAST(DateTime AS TIME) AS TradeTime,
+    CAST(DATEDIFF('day', DateTime, Expiry) AS INT) AS DaysToExpiry,
+    CAST(DATE_PART('dow', DateTime) AS INT) AS DayOfWeek
+"""
+
+# Days before the first new row of a ticker searched for a row to restart its forward fill from when
+# the bar tables are updated after a load
+BAR_LOOKBACK_DAYS = 10
+
+# Compact storage (CreateDB(compact=True)): Underlying and Type become ENUM columns, which DataFetcher
+# returns as pandas categoricals. Their values are few and rarely new. Ticker gets new values with every
+# expiry, so it stays a VARCHAR, which DuckDB dictionary-compresses on disk already.
+ENUM_COLUMNS = ['Underlying', 'Type']
+
+# Strike is stored as an INTEGER, the missing strike of the index rows (NaN) as NULL
+STRIKE_CODE = "CASE WHEN isnan(Strike) THEN NULL ELSE CAST(Strike AS INT) END"
 
 class CreateDB:
     """
@@ -13,23 +64,40 @@ class CreateDB:
     data_folder : str
         Path to the folder containing CSV files.
     db_path : str
-        Path to the DuckDB database file.
+        Path to the DuckDB database file, or to the dataset directory for Parquet storage.
+    storage : str
+        'duckdb' to store the rows in the `data` table of db_path, 'parquet' to write a hive-partitioned
+        Parquet dataset (Underlying/ExpiryDate/TradeDate) under db_path. The manifest of a Parquet
+        dataset is kept in db_path/manifest.db.
     conn : duckdb.DuckDBPyConnection
         DuckDB connection object.
     table_name : str
         Name of the table to be created in the database.
 
+    manifest_table : str
+        Name of the table recording the ingested files.
+    timeframes : tuple
+        Bar lengths in minutes precomputed into `data_{N}min` tables, empty to skip them.
+    compact : bool
+        Whether Underlying and Type are stored as ENUM and Strike as INTEGER. A table created compact stays compact.
+
     Methods:
     --------
     create_table():
         Creates the table in the database if it does not already exist.
     insert_data():
-        Inserts data from CSV files into the table.
+        Inserts data from new or changed CSV files into the table.
+    deduplicate():
+        Removes rows repeating a (Ticker, DateTime) pair.
+    create_bar_tables():
+        Precomputes the resampled bars of every ticker for each of the timeframes.
+    update_bar_tables():
+        Recomputes the bars changed by the rows being loaded.
     run():
         Runs the process of creating the table and inserting the data.
     """
 
-    def __init__(self, data_folder, db_path):
+    def __init__(self, data_folder, db_path, threads=None, storage='duckdb', timeframes=(), compact=False):
         """
         Initializes the CreateDB class with the specified data folder and database path.
 
@@ -39,17 +107,49 @@ class CreateDB:
             Path to the folder containing CSV files.
         db_path : str
             Path to the DuckDB database file.
+        threads : int, optional
+            Number of DuckDB threads used for reading the CSV files, all cores by default.
+        storage : str, optional
+            'duckdb' (default) or 'parquet'.
+        timeframes : tuple, optional
+            Bar lengths in minutes to precompute, e.g. (3, 5, 15, 30, 60). duckdb storage only.
+        compact : bool, optional
+            Store Underlying and Type as ENUM and Strike as INTEGER, converting an existing table.
+            duckdb storage only, Parquet files dictionary-encode strings already.
         """
+        if storage not in ('duckdb', 'parquet'):
+            raise ValueError(f"Invalid storage: {storage}. Allowed values are: ['duckdb', 'parquet']")
+        if timeframes and storage != 'duckdb':
+            raise ValueError("Bar tables are only built for duckdb storage")
+        if compact and storage != 'duckdb':
+            raise ValueError("Compact storage is only available for duckdb storage")
         self.data_folder = pathlib.Path(data_folder)
         self.db_path = db_path
+        self.storage = storage
         print(self.db_path)
-        self.conn = duckdb.connect(database=str(self.db_path))
+        if storage == 'parquet':
+            pathlib.Path(db_path).mkdir(parents=True, exist_ok=True)
+            self.conn = duckdb.connect(database=str(pathlib.Path(db_path) / 'manifest.db'))
+        else:
+            self.conn = duckdb.connect(database=str(self.db_path))
         self.table_name = 'data'
+        self.manifest_table = 'ingest_manifest'
+        self.timeframes = tuple(int(minutes) for minutes in timeframes)
+        self.compact = compact
+        if threads is not None:
+            self.conn.execute(f"SET threads = {int(threads)}")
 
     def create_table(self):
         """
-        Creates the table in the DuckDB database if it does not already exist.
+        Creates the table in the DuckDB database if it does not already exist, or adds the derived
+        columns to a table created without them.
+
+        Rows are kept ordered by (Underlying, Expiry, Type, DateTime), so that the row groups of one
+        expiry cover a short range of TradeDate and DaysToExpiry.
         """
+        if self.storage == 'parquet':
+            self.create_manifest()
+            return
         query = f"""
             CREATE TABLE IF NOT EXISTS {self.table_name} (
                 DateTime TIMESTAMP,
@@ -65,42 +165,332 @@ class CreateDB:
                 Strike FLOAT,
                 Type VARCHAR,
                 Date TIMESTAMP,
-                Weekday INT
+                Weekday INT,
+                TradeDate DATE,
+                TradeTime TIME,
+                DaysToExpiry INT,
+                DayOfWeek INT
             )
         """
         self.conn.execute(query)
+        columns = {row[0] for row in self.conn.execute(f"DESCRIBE {self.table_name}").fetchall()}
+        if 'TradeDate' not in columns:
+            print(f"Adding derived columns to {self.table_name}")
+            self.conn.execute(f"""
+                CREATE OR REPLACE TABLE {self.table_name} AS
+                SELECT *, {DERIVED_SELECT}
+                FROM {self.table_name}
+                ORDER BY Underlying, Expiry, Type, DateTime
+            """)
+        if self._column_type('Strike') == 'INTEGER':
+            self.compact = True
+        elif self.compact:
+            print(f"Converting {self.table_name} to compact storage")
+            self._check_strikes(self.table_name)
+            self.conn.execute(f"ALTER TABLE {self.table_name} ALTER Strike TYPE INTEGER USING {STRIKE_CODE}")
+            self._extend_enums([self.table_name])
+        self.create_manifest()
+
+    def _column_type(self, column, table=None):
+        return self.conn.execute("SELECT data_type FROM duckdb_columns() WHERE table_name = ? AND column_name = ?",
+                                 [table or self.table_name, column]).fetchone()[0]
+
+    def _check_strikes(self, table):
+        fractional = self.conn.execute(f"SELECT COUNT(*) FROM {table} WHERE Strike <> ROUND(Strike)").fetchone()[0]
+        if fractional:
+            raise ValueError(f"{fractional} rows of {table} have a fractional Strike, which compact storage cannot hold")
+
+    def _extend_enums(self, sources):
+        # Creates the ENUM type of every ENUM_COLUMNS column, or recreates it when sources hold new values.
+        # The columns using the type (data and bar tables) are turned back to VARCHAR while it is replaced.
+        # Values are sorted so that ENUM order is the same as VARCHAR order in ORDER BY.
+        for column in ENUM_COLUMNS:
+            type_name = f"{column.lower()}_enum"
+            union = ' UNION '.join(f"SELECT DISTINCT CAST({column} AS VARCHAR) AS Value FROM {source}" for source in sources)
+            values = [value for (value,) in self.conn.execute(f"SELECT Value FROM ({union}) WHERE Value IS NOT NULL ORDER BY Value").fetchall()]
+            current = None
+            if self.conn.execute("SELECT COUNT(*) FROM duckdb_types() WHERE type_name = ?", [type_name]).fetchone()[0]:
+                current = self.conn.execute(f"SELECT enum_range(NULL::{type_name})").fetchone()[0]
+            if not values or (current is not None and set(values) <= set(current) and
+                              self._column_type(column).startswith('ENUM')):
+                continue
+
+            tables = [table for (table,) in self.conn.execute(
+                "SELECT table_name FROM duckdb_columns() WHERE column_name = ? AND data_type LIKE 'ENUM%'", [column]).fetchall()]
+            if self.table_name not in tables:
+                tables.append(self.table_name)
+            values = sorted(set(values) | set(current or []))
+            for table in tables:
+                self.conn.execute(f"ALTER TABLE {table} ALTER {column} TYPE VARCHAR")
+            self.conn.execute(f"DROP TYPE IF EXISTS {type_name}")
+            self.conn.execute(f"CREATE TYPE {type_name} AS ENUM ({', '.join(self._literal(value) for value in values)})")
+            for table in tables:
+                self.conn.execute(f"ALTER TABLE {table} ALTER {column} TYPE {type_name}")
+
+    @staticmethod
+    def _literal(value):
+        return "'" + str(value).replace("'", "''") + "'"
+
+    def create_manifest(self):
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.manifest_table} (
+                Path VARCHAR PRIMARY KEY,
+                Size BIGINT,
+                MTime DOUBLE,
+                RowCount BIGINT,
+                IngestedAt TIMESTAMP
+            )
+        """)
+
+    def pending_files(self):
+        """
+        CSV files of the data folder which are not in the manifest, or whose size or mtime changed since.
+        """
+        ingested = {path: (size, mtime) for path, size, mtime in
+                    self.conn.execute(f"SELECT Path, Size, MTime FROM {self.manifest_table}").fetchall()}
+        pending = []
+        for file_path in sorted(self.data_folder.glob('*.csv')):
+            stat = file_path.stat()
+            if ingested.get(str(file_path.resolve())) != (stat.st_size, stat.st_mtime):
+                pending.append(file_path)
+        return pending
+
+    def _load_files(self, csv_files):
+        # Reads the files with DuckDB's parallel CSV reader into a staging table, then appends the rows
+        # whose (Ticker, DateTime) is not in the table yet. The anti-join only scans the time range of
+        # the new rows, so daily top-ups do not read the whole history.
+        files = [str(file_path.resolve()) for file_path in csv_files]
+        columns = '{' + ', '.join(f"'{name}': '{dtype}'" for name, dtype in CSV_COLUMNS.items()) + '}'
+        self.conn.execute("DROP TABLE IF EXISTS staging")
+        self.conn.execute(f"""
+            CREATE TEMP TABLE staging AS
+            SELECT {CSV_SELECT}, filename AS Path
+            FROM read_csv(?, header = true, columns = {columns}, filename = true)
+        """, [files])
+
+        if self.compact:
+            self._check_strikes('staging')
+            self.conn.execute(f"ALTER TABLE staging ALTER Strike TYPE INTEGER USING {STRIKE_CODE}")
+            self._extend_enums(['staging', self.table_name])
+
+        row_counts = dict(self.conn.execute("SELECT Path, COUNT(*) FROM staging GROUP BY Path").fetchall())
+        from_date, to_date = self.conn.execute("SELECT MIN(DateTime), MAX(DateTime) FROM staging").fetchone()
+        if self.storage == 'parquet':
+            self._write_parquet(from_date, to_date)
+        else:
+            self._insert_table(from_date, to_date)
+            # In the transaction of the load, so the bars are never older than the rows
+            self.update_bar_tables()
+        self.conn.execute("DROP TABLE staging")
+
+        now = dt.datetime.now()
+        for file_path, path in zip(csv_files, files):
+            stat = file_path.stat()
+            self.conn.execute(f"INSERT OR REPLACE INTO {self.manifest_table} VALUES (?, ?, ?, ?, ?)",
+                              [path, stat.st_size, stat.st_mtime, row_counts.get(path, 0), now])
+            print(f"Data from {file_path} inserted successfully")
+
+    def _insert_table(self, from_date, to_date):
+        self.conn.execute(f"""
+            INSERT INTO {self.table_name}
+            SELECT * EXCLUDE (Path), {DERIVED_SELECT}
+            FROM staging s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {self.table_name} d
+                WHERE d.DateTime >= ? AND d.DateTime <= ?
+                  AND d.Ticker = s.Ticker AND d.DateTime = s.DateTime
+            )
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY Ticker, DateTime ORDER BY Path) = 1
+            ORDER BY Underlying, Expiry, Type, DateTime
+        """, [from_date, to_date])
+
+    def _write_parquet(self, from_date, to_date):
+        # Appends the staged rows as new files in their Underlying/ExpiryDate/TradeDate partitions.
+        # Existing rows are only looked up in the partitions of the new trade dates.
+        dataset = pathlib.Path(self.db_path).as_posix()
+        existing = "SELECT NULL::VARCHAR AS Ticker, NULL::TIMESTAMP AS DateTime WHERE false"
+        if any(pathlib.Path(self.db_path).glob('**/*.parquet')):
+            existing = f"""
+                SELECT Ticker, DateTime
+                FROM read_parquet('{dataset}/**/*.parquet', hive_partitioning = true, hive_types = {HIVE_TYPES})
+                WHERE TradeDate >= CAST(? AS DATE) AND TradeDate <= CAST(? AS DATE)
+            """
+        params = [from_date, to_date] if 'WHERE TradeDate' in existing else []
+        self.conn.execute(f"""
+            COPY (
+                SELECT * EXCLUDE (Path), CAST(Expiry AS DATE) AS ExpiryDate, {DERIVED_SELECT}
+                FROM staging s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM ({existing}) d
+                    WHERE d.Ticker = s.Ticker AND d.DateTime = s.DateTime
+                )
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY Ticker, DateTime ORDER BY Path) = 1
+                ORDER BY Underlying, Expiry, Type, DateTime
+            ) TO '{dataset}' (FORMAT PARQUET, PARTITION_BY (Underlying, ExpiryDate, TradeDate),
+                             OVERWRITE_OR_IGNORE true, FILENAME_PATTERN 'part_{{uuid}}')
+        """, params)
 
     def insert_data(self):
         """
-        Inserts data from CSV files in the specified data folder into the database table.
+        Inserts data from new or changed CSV files in the specified data folder into the database table.
+
+        All pending files are loaded in one parallel read. If that fails, the files are loaded one at a
+        time so that a bad file is reported and skipped without blocking the others.
+
+        Returns:
+            List of the files found pending, empty when there was nothing to load.
         """
-        csv_files = list(self.data_folder.glob('*.csv'))
-        if not csv_files:
+        if not list(self.data_folder.glob('*.csv')):
             print(f"No CSV files found in {self.data_folder}")
-            return
+            return []
+
+        csv_files = self.pending_files()
+        if not csv_files:
+            print(f"No new CSV files in {self.data_folder}")
+            return []
+
+        try:
+            self.conn.execute("BEGIN TRANSACTION")
+            self._load_files(csv_files)
+            self.conn.execute("COMMIT")
+        except Exception as e:
+            self.conn.execute("ROLLBACK")
+            print(f"Bulk load failed ({e}), loading files one at a time")
+            for file_path in csv_files:
+                try:
+                    self.conn.execute("BEGIN TRANSACTION")
+                    self._load_files([file_path])
+                    self.conn.execute("COMMIT")
+                except Exception as e:
+                    self.conn.execute("ROLLBACK")
+                    print(f"Error processing file {file_path}: {e}")
+        return csv_files
+
+    def deduplicate(self):
+        """
+        Removes rows repeating a (Ticker, DateTime) pair, e.g. left by loads made before the manifest existed.
+        """
+        if self.storage == 'parquet':
+            raise ValueError("deduplicate is only needed for duckdb storage, Parquet datasets are deduplicated on load")
+        self.conn.execute(f"""
+            CREATE OR REPLACE TABLE {self.table_name} AS
+            SELECT * FROM {self.table_name}
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY Ticker, DateTime) = 1
+            ORDER BY Underlying, Expiry, Type, DateTime
+        """)
+        self.create_bar_tables()
+
+    def bar_table(self, minutes):
+        return f"{self.table_name}_{int(minutes)}min"
+
+    def existing_timeframes(self):
+        """
+        Bar lengths in minutes of the `data_{N}min` tables in the database, whatever timeframes built them.
+        """
+        pattern = re.compile(rf"{self.table_name}_(\d+)min")
+        tables = self.conn.execute("SELECT table_name FROM information_schema.tables").fetchall()
+        return {int(match.group(1)) for (name,) in tables if (match := pattern.fullmatch(name))}
+
+    def create_bar_tables(self, rebuild=True):
+        """
+        Builds the `data_{N}min` table of every timeframe, read by DataFetcher.fetch_options_data
+        instead of resampling on each call.
+
+        The bars are the same as fetch_and_resample_data gives for a whole ticker: forward filled on the
+        NIFTY minutes between the first and the last row of the ticker. Loads keep them up to date with
+        update_bar_tables, also the tables of timeframes this CreateDB was not given.
 
-        for file_path in csv_files:
-            try:
-                df = pd.read_csv(file_path)
-                df['DateTime'] = pd.to_datetime(df['DateTime'], errors='coerce')
-                df['Expiry'] = pd.to_datetime(df['Expiry'], errors='coerce')
-                df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-                df[['Open', 'High', 'Low', 'Close', 'Strike']] = df[['Open', 'High', 'Low', 'Close', 'Strike']].astype(float)
-                df[['Volume', 'OI', 'Weekday']] = df[['Volume', 'OI', 'Weekday']].astype(int)
-                df[['Type', 'Ticker', 'Underlying']] = df[['Type', 'Ticker', 'Underlying']].astype(str)
-
-                query = f"INSERT INTO {self.table_name} SELECT * FROM df"
-                self.conn.execute(query)
-                print(f"Data from {file_path} inserted successfully")
-            except Exception as e:
-                print(f"Error processing file {file_path}: {e}")
+        Parameters:
+        -----------
+        rebuild : bool
+            True to rebuild the existing bar tables as well, False to only build the missing tables of timeframes.
+        """
+        existing = self.existing_timeframes()
+        for minutes in sorted(set(self.timeframes) | (existing if rebuild else set())):
+            table = self.bar_table(minutes)
+            if not rebuild and minutes in existing:
+                continue
+            self.conn.execute(f"CREATE OR REPLACE TABLE {table} AS {resample_query(self.table_name, minutes)}")
+            print(f"Bar table {table} created")
+
+    def update_bar_tables(self):
+        """
+        Recomputes the bars changed by the rows of the staging table, in every bar table of the database.
+
+        The forward fill only carries values forward, so the bars of a ticker change from the first day of
+        its new rows on, and new NIFTY minutes change the tickers trading from then on. Those bars are
+        deleted and computed again. The fill restarts from the day of the last complete row of the ticker
+        in the BAR_LOOKBACK_DAYS days before (its whole history without one, or for timeframes not dividing
+        a day), so the cost follows the loaded days rather than the size of the table.
+        Missing tables of timeframes are built whole.
+        """
+        existing = self.existing_timeframes()
+        if set(self.timeframes) - existing:
+            self.create_bar_tables(rebuild=False)
+        if not existing:
+            return
+        # Bars of the shortest timeframe tell which columns a ticker had no value in yet
+        bars = self.bar_table(min(existing))
+        self.conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE bar_updates AS
+            WITH dirty AS (
+                SELECT Ticker, MIN(DateTime) AS Dirty FROM staging GROUP BY Ticker
+                UNION ALL
+                SELECT DISTINCT d.Ticker, s.Dirty
+                FROM {self.table_name} d, (SELECT MIN(DateTime) AS Dirty FROM staging WHERE Ticker = 'NIFTY') s
+                WHERE d.DateTime >= s.Dirty
+            ),
+            days AS (
+                SELECT Ticker, date_trunc('day', MIN(Dirty)) AS DirtyDay FROM dirty GROUP BY Ticker HAVING MIN(Dirty) IS NOT NULL
+            ),
+            last_bars AS (
+                SELECT b.* FROM {bars} b JOIN days u ON b.Ticker = u.Ticker
+                WHERE b.DateTime < u.DirtyDay AND b.DateTime >= u.DirtyDay - INTERVAL {BAR_LOOKBACK_DAYS + 1} DAY
+                QUALIFY row_number() OVER (PARTITION BY b.Ticker ORDER BY b.DateTime DESC) = 1
+            )
+            SELECT u.Ticker, u.DirtyDay, date_trunc('day', MAX(d.DateTime)) AS FromDay
+            FROM days u
+            LEFT JOIN last_bars l ON l.Ticker = u.Ticker
+            LEFT JOIN {self.table_name} d
+              ON d.Ticker = u.Ticker AND d.DateTime < u.DirtyDay
+             AND d.DateTime >= u.DirtyDay - INTERVAL {BAR_LOOKBACK_DAYS} DAY AND {complete_row('d', 'l')}
+            GROUP BY u.Ticker, u.DirtyDay
+        """)
+        for minutes in sorted(existing):
+            table = self.bar_table(minutes)
+            if 1440 % minutes == 0:
+                # Buckets start again at every midnight, the bars before the day are left as they are
+                cutoff, start = "u.DirtyDay", "u.FromDay"
+                first_day = "SELECT CASE WHEN COUNT(*) = COUNT(FromDay) THEN MIN(FromDay) END FROM bar_updates"
+            else:
+                # Buckets run on from the first day of the ticker, which its whole history is needed for
+                cutoff, start, first_day = f"u.DirtyDay - INTERVAL {minutes} MINUTE", "NULL", "SELECT NULL"
+            rows = f"""(
+                SELECT d.* FROM {self.table_name} d JOIN bar_updates u ON d.Ticker = u.Ticker
+                WHERE {start} IS NULL OR d.DateTime >= {start}
+            )"""
+            spine = f"""
+                SELECT DISTINCT DateTime FROM {self.table_name}
+                WHERE Ticker = 'NIFTY' AND DateTime >= COALESCE(({first_day}), '-infinity'::TIMESTAMP)
+            """
+            self.conn.execute(f"DELETE FROM {table} b USING bar_updates u WHERE b.Ticker = u.Ticker AND b.DateTime >= {cutoff}")
+            self.conn.execute(f"""
+                INSERT INTO {table}
+                SELECT b.* FROM ({resample_query(rows, minutes, spine=spine)}) b JOIN bar_updates u ON b.Ticker = u.Ticker
+                WHERE b.DateTime >= {cutoff}
+            """)
+            print(f"Bar table {table} updated")
+        self.conn.execute("DROP TABLE bar_updates")
 
     def run(self):
         """
         Runs the process of creating the table and inserting the data into the DuckDB database.
         """
         self.create_table()
+        # Loads update the bar tables, only those of new timeframes are left to build
         self.insert_data()
+        if self.timeframes:
+            self.create_bar_tables(rebuild=False)
         print("Database setup and data insertion complete")
 
 
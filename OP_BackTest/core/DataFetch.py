@@ -1,23 +1,131 @@
-import duckdb
 import pandas as pd
 import datetime as dt
-import os
+import threading
+from OP_BackTest.core.ChainCache import ChainSnapshot, ChainSnapshotCache
+from OP_BackTest.core.Calendar import TradingCalendar
+from OP_BackTest.core.ConnectionPool import open_database
+from OP_BackTest.core.Profiler import NULL_PROFILER
+from OP_BackTest.core.Resample import BAR_AGGREGATIONS, BAR_COLUMNS, period_minutes, resample_query
 
 # show all columns
 pd.set_option('display.max_columns', None)
 
+# Columns of the data table, also the columns of fetched and resampled frames
+DATA_COLUMNS = ['DateTime', 'Open', 'High', 'Low', 'Close', 'Volume', 'OI', 'Underlying', 'Ticker', 'Expiry', 'Strike', 'Type', 'Date', 'Weekday']
+
+# Columns precomputed by CreateDB from DateTime and Expiry, filtered on directly instead of on expressions
+DERIVED_COLUMNS = ['TradeDate', 'TradeTime', 'DaysToExpiry', 'DayOfWeek']
+
+# String columns returned as pandas categoricals by DataFetcher(compact=True)
+CATEGORICAL_COLUMNS = ['Underlying', 'Ticker', 'Type']
+
+# ExpiryDate partition of a Parquet dataset as a DATE, the index rows ('NULL' or the default partition) after
+# every expiry. DuckDB 1.0 fails on partition filters evaluating to NULL, so the value is never NULL. The
+# row filters on Expiry still leave the index rows out.
+PARTITION_EXPIRY = "COALESCE(TRY_CAST(ExpiryDate AS DATE), DATE '9999-12-31')"
+
+# Result types of the fetch methods: DataFrame, pyarrow Table or dict of NumPy arrays
+OUTPUTS = ['pandas', 'arrow', 'numpy']
+
 class DataFetcher:
-    def __init__(self,db_path=None):
+    def __init__(self,db_path=None,chain_cache_days=5,pool=None,compact=False,profiler=None):
+        """
+        Args:
+            db_path: DuckDB file, Arrow file or Parquet dataset directory, see ConnectionPool.open_database.
+            chain_cache_days: Trading days of chain snapshots kept in memory.
+            pool: ConnectionPool sharing the database handle, one cursor per thread and parsed statements.
+                None to open a connection owned by this fetcher.
+            compact: Return Underlying, Ticker and Type as pandas categoricals instead of object columns.
+                Columns stored as ENUM by CreateDB(compact=True) are categoricals either way.
+            profiler: StageProfiler recording every query as a 'query' stage, disabled by default.
+        """
         if db_path is None:
             db_path = 'data.db'
             # raise ValueError("Database path not found")
         #     print path
         # print("Database Path : ", db_path)
-        self.conn = duckdb.connect(database=db_path, read_only=True)
+        self.pool = pool
+        self.compact = compact
+        self.profiler = NULL_PROFILER if profiler is None else profiler
+        if pool is not None:
+            self._database = pool.database(db_path, DATA_COLUMNS)
+            self.partitioned = self._database['partitioned']
+            # Calendar and table metadata are built once for all the fetchers of the database
+            self._shared = self._database['shared']
+        else:
+            self._database = None
+            self._conn, _, self.partitioned = open_database(db_path, DATA_COLUMNS)
+            self._shared = {}
+        if 'sargable' not in self._shared:
+            columns = {row[0] for row in self.conn.execute("DESCRIBE data").fetchall()}
+            # Databases created before the derived columns existed are filtered on DateTime expressions
+            self._shared['sargable'] = set(DERIVED_COLUMNS) <= columns
+        self.sargable = self._shared['sargable']
+        self.chain_cache = ChainSnapshotCache(max_days=chain_cache_days)
+
+    @property
+    def conn(self):
+        # Pooled fetchers query through the cursor of the calling thread
+        if self._database is not None:
+            return self.pool.cursor(self._database)
+        return self._conn
 
-    def _execute_query(self, query, params=[]):
+    @property
+    def calendar(self):
+        # Built on first use, the connection is read only so it stays valid for the fetcher lifetime
+        if 'calendar' not in self._shared:
+            self._shared['calendar'] = TradingCalendar.from_connection(self.conn)
+        return self._shared['calendar']
+
+    @property
+    def bar_tables(self):
+        # Names of the bar tables precomputed by CreateDB(timeframes=...), e.g. {'data_3min'}
+        if 'bar_tables' not in self._shared:
+            tables = self.conn.execute("SELECT table_name FROM information_schema.tables").fetchall()
+            self._shared['bar_tables'] = {name for (name,) in tables if name.startswith('data_') and name.endswith('min')}
+        return self._shared['bar_tables']
+
+    def _execute_query(self, query, params=[], output='pandas'):
         # print(query, params)
-        return self.conn.execute(query, params).fetch_df()
+        if output not in OUTPUTS:
+            raise ValueError(f"Invalid output: {output}. Allowed values are: {OUTPUTS}")
+        conn = self.conn
+        if self.pool is not None:
+            query = self.pool.statement(conn, query)
+        with self.profiler.stage('query') as stage:
+            result = conn.execute(query, params)
+            if output == 'arrow':
+                # to_arrow_table replaces fetch_arrow_table in newer DuckDB releases
+                table = (getattr(result, 'to_arrow_table', None) or result.fetch_arrow_table)()
+                stage.rows = table.num_rows
+                return table
+            if output == 'numpy':
+                arrays = result.fetchnumpy()
+                stage.rows = len(next(iter(arrays.values()))) if arrays else 0
+                return arrays
+            df = result.fetch_df()
+            stage.rows = df.shape[0]
+        if self.compact:
+            for column in CATEGORICAL_COLUMNS:
+                if column in df.columns and df[column].dtype == object:
+                    df[column] = df[column].astype('category')
+        return df
+
+    @staticmethod
+    def _convert(df, output):
+        # Same result types as _execute_query, for frames computed in pandas
+        if output == 'arrow':
+            import pyarrow as pa
+            return pa.Table.from_pandas(df, preserve_index=False)
+        if output == 'numpy':
+            return {column: df[column].to_numpy() for column in df.columns}
+        return df
+
+    def _select_list(self, columns, available):
+        invalid = [column for column in columns if column not in available]
+        if invalid:
+            raise ValueError(f"Invalid columns: {invalid}. Allowed columns are: {available}")
+        return ', '.join(columns)
 
     def get_columns(self):
         query = "SELECT * FROM data LIMIT 1"
@@ -58,24 +166,18 @@ class DataFetcher:
             if key in ['DateTime', 'Expiry', 'FromDate', 'ToDate', 'Date'] and not isinstance(value, (str, dt.datetime)):
                 raise TypeError(f"Invalid data type for {key}. Expected string or datetime object.")
 
-    def fetch_options_data(self, conditions=None, resample_period='1min', order_by=None):
-        if order_by is None:
-            order_by = ['DateTime', 'Type', 'Open']
-        self._validate_conditions(conditions)
-        conditions = conditions or {'StartDaysBeforeExpiry': 6, 'EndDaysBeforeExpiry': 0, 'EveryDayStartTime': '09:15:00', 'EveryDayEndTime': '15:30:00'}
-
-        ## Delete in next version
-        if conditions.get('Ticker') == 'NIFTY':
-            conditions['Ticker'] = 'NIFTY'
-            conditions.pop('Expiry', None)
-            conditions.pop('Type', None)
-            conditions.pop('Strike', None)
-
+    def _build_where(self, conditions):
+        # Translates fetch_options_data conditions into WHERE predicates and their parameters
         common_keys = ['DateTime', 'Expiry', 'Type', 'Strike', 'Ticker', 'FromDate', 'ToDate', 'Date', 'Time', 'Weekday', 'DaysBeforeExpiry',
                        'StartDaysBeforeExpiry', 'EndDaysBeforeExpiry', 'EveryDayStartTime', 'EveryDayEndTime', 'CloseLessThan', 'CloseGreaterThan']
 
         where_conditions = []
         params = []
+        if self.sargable:
+            derived = {'Date': 'TradeDate', 'Time': 'TradeTime', 'Weekday': 'DayOfWeek', 'DaysToExpiry': 'DaysToExpiry'}
+        else:
+            derived = {'Date': 'CAST(DateTime AS DATE)', 'Time': 'CAST(DateTime AS TIME)', 'Weekday': "DATE_PART('dow', DateTime)",
+                       'DaysToExpiry': "DATEDIFF('day', DateTime, Expiry)"}
 
         for key, value in conditions.items():
             if key in common_keys:
@@ -83,14 +185,12 @@ class DataFetcher:
                     where_conditions.append(f"{key} = ?")
                 elif key in ['FromDate', 'ToDate']:
                     where_conditions.append(f"DateTime {'>=' if key == 'FromDate' else '<='} ?")
-                elif key in ['Date', 'Time']:
-                    where_conditions.append(f"CAST(DateTime AS {key.upper()}) = ?")
-                elif key == 'Weekday':
-                    where_conditions.append("DATE_PART('dow', DateTime) = ?")
+                elif key in ['Date', 'Time', 'Weekday']:
+                    where_conditions.append(f"{derived[key]} = ?")
                 elif key in ['DaysBeforeExpiry', 'StartDaysBeforeExpiry', 'EndDaysBeforeExpiry']:
-                    where_conditions.append(f"DATEDIFF('day', DateTime, Expiry) {'=' if key == 'DaysBeforeExpiry' else '<=' if key == 'StartDaysBeforeExpiry' else '>='} ?")
+                    where_conditions.append(f"{derived['DaysToExpiry']} {'=' if key == 'DaysBeforeExpiry' else '<=' if key == 'StartDaysBeforeExpiry' else '>='} ?")
                 elif key in ['EveryDayStartTime', 'EveryDayEndTime']:
-                    where_conditions.append(f"CAST(DateTime AS TIME) {'>=' if key == 'EveryDayStartTime' else '<='} ?")
+                    where_conditions.append(f"{derived['Time']} {'>=' if key == 'EveryDayStartTime' else '<='} ?")
                 elif key in ['CloseLessThan', 'CloseGreaterThan']:
                     where_conditions.append(f"Close {'<' if key == 'CloseLessThan' else '>'} ?")
                 params.append(value)
@@ -99,18 +199,98 @@ class DataFetcher:
                 if key in ['DateTime_M', 'Strike_M', 'Ticker_M']:
                     where_conditions.append(f"{key[:-2]} IN ({','.join(['?'] * len(value))})")
                     params.extend(value)
-                elif key in ['Date_M', 'Time_M']:
-                    where_conditions.append(f"CAST(DateTime AS {key[:-2].upper()}) IN ({','.join(['?'] * len(value))})")
-                    params.extend(value)
-                elif key == 'Weekday_M':
-                    where_conditions.append("DATE_PART('dow', DateTime) IN ({})".format(",".join("?" * len(value))))
+                elif key in ['Date_M', 'Time_M', 'Weekday_M']:
+                    where_conditions.append(f"{derived[key[:-2]]} IN ({','.join(['?'] * len(value))})")
                     params.extend(value)
 
+        if self.partitioned:
+            where_conditions.extend(self._partition_predicates(conditions, params))
+        return where_conditions, params
+
+    def _partition_predicates(self, conditions, params):
+        # Extra predicates on the hive partition columns (ExpiryDate, TradeDate) of a Parquet dataset.
+        # They repeat the date parts of the conditions so that DuckDB skips whole partitions.
+        predicates = []
+        for key, value in conditions.items():
+            if key in ['FromDate', 'ToDate']:
+                predicates.append(f"TradeDate {'>=' if key == 'FromDate' else '<='} CAST(? AS DATE)")
+            elif key == 'DateTime' or (key == 'Date' and not self.sargable):
+                predicates.append("TradeDate = CAST(? AS DATE)")
+            elif key == 'Expiry':
+                predicates.append(f"{PARTITION_EXPIRY} = CAST(? AS DATE)")
+            elif key in ['DaysBeforeExpiry', 'StartDaysBeforeExpiry', 'EndDaysBeforeExpiry']:
+                predicates.append(f"DATEDIFF('day', TradeDate, {PARTITION_EXPIRY}) {'=' if key == 'DaysBeforeExpiry' else '<=' if key == 'StartDaysBeforeExpiry' else '>='} ?")
+            else:
+                continue
+            params.append(value)
+        return predicates
+
+    def fetch_options_data(self, conditions=None, resample_period='1min', order_by=None, columns=None, output='pandas'):
+        """
+        Rows of the data table matching conditions, resampled to resample_period.
+
+        Args:
+            conditions: Filters, see get_conditions for the valid keys.
+            resample_period: Bar length, '1min' for the stored rows.
+            order_by: Sort columns of the 1-minute rows, bars are ordered by Ticker and DateTime.
+            columns: Columns to return, all of them by default. Only these columns are read and converted.
+            output: 'pandas' (default) for a DataFrame, 'arrow' for a pyarrow Table or 'numpy' for a dict of
+                NumPy arrays, the last two without building pandas objects.
+        """
+        if output not in OUTPUTS:
+            raise ValueError(f"Invalid output: {output}. Allowed values are: {OUTPUTS}")
+        if order_by is None:
+            order_by = ['DateTime', 'Type', 'Open']
+        self._validate_conditions(conditions)
+        conditions = conditions or {'StartDaysBeforeExpiry': 6, 'EndDaysBeforeExpiry': 0, 'EveryDayStartTime': '09:15:00', 'EveryDayEndTime': '15:30:00'}
+
+        ## Delete in next version
+        if conditions.get('Ticker') == 'NIFTY':
+            conditions['Ticker'] = 'NIFTY'
+            conditions.pop('Expiry', None)
+            conditions.pop('Type', None)
+            conditions.pop('Strike', None)
+
+        if resample_period != '1min' and list(conditions) == ['Ticker']:
+            # Whole ticker history, precomputed at ingest when CreateDB was given this timeframe
+            bar_table = f"data_{period_minutes(resample_period)}min"
+            if bar_table in self.bar_tables:
+                select_list = '*' if columns is None else self._select_list(columns, BAR_COLUMNS)
+                return self._execute_query(f"SELECT {select_list} FROM {bar_table} WHERE Ticker = ? ORDER BY DateTime",
+                                           [conditions['Ticker']], output=output)
+
+        where_conditions, params = self._build_where(conditions)
         where_clause = " AND ".join(where_conditions)
 
+        minutes = period_minutes(resample_period) if resample_period != '1min' else None
+        if minutes is not None:
+            # Filter, forward fill and resample in one query, the minute rows are never loaded in pandas
+            rows = f"(SELECT {', '.join(DATA_COLUMNS)} FROM data WHERE {where_clause})"
+            query = resample_query(rows, minutes, window=True)
+            if columns is not None:
+                query = f"SELECT {self._select_list(columns, BAR_COLUMNS)} FROM ({query}) ORDER BY Ticker, DateTime"
+            return self._execute_query(query, params + [conditions.get('FromDate'), conditions.get('ToDate')], output=output)
+
+        if columns is not None:
+            select_list = self._select_list(columns, DATA_COLUMNS + (DERIVED_COLUMNS if self.sargable else []))
+        else:
+            select_list = f"""{', '.join(DATA_COLUMNS)},
+                       {'TradeDate' if self.sargable else 'CAST(DateTime AS DATE)'} AS Date,
+                       {'DayOfWeek' if self.sargable else "DATE_PART('dow', DateTime)"} AS Weekday"""
+        if resample_period == '1min':
+            query = f"""
+                SELECT {select_list}
+                FROM data
+                WHERE {where_clause}
+                ORDER BY {', '.join(order_by)}
+            """
+            return self._execute_query(query, params, output=output)
+
+        # Periods which are not whole minutes are resampled in pandas
         query = f"""
-                SELECT *,
-                       CAST(DateTime AS DATE) AS Date, DATE_PART('dow', DateTime) AS Weekday
+                SELECT {', '.join(DATA_COLUMNS)},
+                       {'TradeDate' if self.sargable else 'CAST(DateTime AS DATE)'} AS Date,
+                       {'DayOfWeek' if self.sargable else "DATE_PART('dow', DateTime)"} AS Weekday
                 FROM data
                 WHERE {where_clause}
                 ORDER BY {', '.join(order_by)}
@@ -120,10 +300,71 @@ class DataFetcher:
         conditions['FromDate'] = conditions['FromDate'] if 'FromDate' in conditions else options_data_results['DateTime'].min()
         conditions['ToDate'] = conditions['ToDate'] if 'ToDate' in conditions else options_data_results['DateTime'].max()
 
-        if not options_data_results.empty and resample_period != '1min':
+        if not options_data_results.empty:
             options_data_results = self.fetch_and_resample_data(options_data_results, resample_period, conditions['FromDate'], conditions['ToDate'])
+            if columns is not None:
+                options_data_results = options_data_results[columns]
+
+        return self._convert(options_data_results, output)
 
-        return options_data_results
+    def fetch_ticker_bars(self, tickers, resample_period='1min'):
+        """
+        Whole history of several tickers with one query, the same bars as
+        fetch_options_data({'Ticker': ticker}, resample_period) returns for each of them.
+
+        Returns:
+            dict of Ticker to DataFrame indexed from 0. Tickers without rows are left out.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return {}
+        minutes = period_minutes(resample_period)
+        if resample_period == '1min':
+            bars = self.fetch_options_data({'Ticker_M': tickers}, order_by=['Ticker', 'DateTime', 'Type', 'Open'])
+        elif minutes is None:
+            # Periods which are not whole minutes are resampled in pandas, one ticker at a time
+            bars = pd.concat([self.fetch_options_data({'Ticker': ticker}, resample_period=resample_period) for ticker in tickers],
+                             ignore_index=True)
+        else:
+            placeholders = ', '.join(['?'] * len(tickers))
+            bar_table = f"data_{minutes}min"
+            if bar_table in self.bar_tables:
+                query = f"SELECT * FROM {bar_table} WHERE Ticker IN ({placeholders}) ORDER BY Ticker, DateTime"
+            else:
+                # Each ticker on the spine between its own first and last row, as when it is fetched alone
+                query = resample_query(f"(SELECT {', '.join(DATA_COLUMNS)} FROM data WHERE Ticker IN ({placeholders}))", minutes)
+            bars = self._execute_query(query, tickers)
+        if bars.empty:
+            return {}
+        return {ticker: frame.reset_index(drop=True) for ticker, frame in bars.groupby('Ticker', sort=False, observed=True)}
+
+    def fetch_chain_snapshot(self, conditions, columns=None):
+        """
+        Same result as fetch_options_data(conditions) for a single 'DateTime', served from memory.
+
+        The whole trading day of the chain is loaded with one query the first time a minute of that day
+        is requested, later minutes of the day are sliced out of the cached snapshot.
+        Args:
+            conditions: fetch_options_data conditions, 'DateTime' is required.
+            columns: Columns kept in the snapshot, all of them by default. 'DateTime' is always included.
+
+        Returns:
+            DataFrame with the chain at conditions['DateTime'].
+        """
+        self._validate_conditions(conditions)
+        day_conditions = dict(conditions)
+        date_time = pd.to_datetime(day_conditions.pop('DateTime'))
+        if columns is not None and 'DateTime' not in columns:
+            columns = ['DateTime', *columns]
+        key = (date_time.date(), tuple(sorted((key, str(value)) for key, value in day_conditions.items())),
+               None if columns is None else tuple(columns))
+
+        snapshot = self.chain_cache.get(key)
+        if snapshot is None:
+            day_conditions['Date'] = str(date_time.date())
+            snapshot = ChainSnapshot(self.fetch_options_data(day_conditions, columns=columns))
+            self.chain_cache.put(key, snapshot)
+        return snapshot.at(date_time)
 
     def fetch_closest_strike_premium(self, closest_premium, conditions=None):
         if conditions is None:
@@ -154,56 +395,108 @@ class DataFetcher:
         params += inner_query_params  # Add inner query params after closest_premium
         return self._execute_query(query, params)
 
+    # Strike selection rules of fetch_strikes_batch: filter on the price column and order of the rows of a
+    # minute, the first row is picked. Thresholds are cast to FLOAT, the type of the price columns, so
+    # comparisons match the pandas selection on the fetched float32 columns.
+    _strike_rules = {
+        'greaterthan': ("{column} > CAST(? AS FLOAT)", "Type, Open, Ticker"),
+        'lessthan': ("{column} < CAST(? AS FLOAT)", "Type DESC, Open DESC, Ticker DESC"),
+        'closest': (None, "ABS({column} - CAST(? AS FLOAT)), Type, Open, Ticker"),
+    }
+
+    def fetch_strikes_batch(self, conditions, rule, value, column='Close', entry_times=None):
+        """
+        Picks the ticker of every minute of a chain with a single query.
+
+        Same choice as Engine.get_strkePrice on the chain of each minute: 'greaterthan' takes the first row
+        with column > value, 'lessthan' the last row with column < value and 'closest' the row whose
+        column is closest to value, rows being in the (Type, Open) order of fetch_options_data.
+
+        Args:
+            conditions: fetch_options_data conditions selecting the chain, e.g. Engine.data_fetch_para() and 'Type'.
+            rule: 'greaterthan', 'lessthan' or 'closest'.
+            value: Threshold or target premium.
+            column: Price column compared, Engine.EntryType.
+            entry_times: Optional list of DateTime values, only these minutes are resolved.
+
+        Returns:
+            DataFrame with DateTime, Ticker, Strike and column, one row per minute having a match, ordered by DateTime.
+        """
+        if rule not in self._strike_rules:
+            raise ValueError(f"Invalid strike rule: {rule}. Allowed values are: {list(self._strike_rules)}")
+        if column not in DATA_COLUMNS:
+            raise ValueError(f"Invalid column: {column}. Allowed values are: {DATA_COLUMNS}")
+        self._validate_conditions(conditions)
+
+        where_conditions, params = self._build_where(conditions)
+        predicate, order = self._strike_rules[rule]
+        if predicate is not None:
+            where_conditions.append(predicate.format(column=column))
+            params.append(value)
+        if entry_times is not None:
+            where_conditions.append("DateTime IN (SELECT UNNEST(CAST(? AS TIMESTAMP[])))")
+            params.append([pd.Timestamp(entry_time).to_pydatetime() for entry_time in entry_times])
+        if rule == 'closest':
+            params.append(value)
+
+        query = f"""
+                SELECT DateTime, Ticker, Strike, {column}
+                FROM data
+                WHERE {" AND ".join(where_conditions)}
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY DateTime ORDER BY {order.format(column=column)}) = 1
+                ORDER BY DateTime
+            """
+        return self._execute_query(query, params)
+
     def fetch_and_resample_data(self, df, resample_period, FromDate=None, ToDate=None):
+        """
+        Resamples 1-minute rows of one or more tickers, each forward filled on the NIFTY minutes
+        between FromDate and ToDate.
+
+        Whole-minute periods are resampled by DuckDB over the registered frame, other periods with pandas.
+        """
         # print(f"Resampling {resample_period} on data size {df.shape[0]}")
         if FromDate is None:
             FromDate = df['DateTime'].min().date()
         if ToDate is None:
             ToDate = df['DateTime'].max().date()
-        query = """
-                    SELECT DISTINCT DateTime
-                    FROM data
-                    WHERE DateTime >= ? AND DateTime <= ? AND Ticker = 'NIFTY'
-                    ORDER BY DateTime
-                """
-        nifty_datetime = self.conn.execute(query, [FromDate, ToDate]).fetch_df()
+        minutes = period_minutes(resample_period)
+        if minutes is None:
+            return self._resample_pandas(df, resample_period, FromDate, ToDate)
+
+        # Registered views are visible to the whole connection, the name is unique per call
+        view = f"resample_rows_{threading.get_ident()}_{id(df)}"
+        conn = self.conn
+        conn.register(view, df.loc[:, ~df.columns.duplicated()][DATA_COLUMNS])
+        try:
+            with self.profiler.stage('query') as stage:
+                bars = conn.execute(resample_query(view, minutes, window=True), [FromDate, ToDate]).fetch_df()
+                stage.rows = bars.shape[0]
+            return bars
+        finally:
+            conn.unregister(view)
+
+    def _resample_pandas(self, df, resample_period, FromDate, ToDate):
+        nifty_datetime = self.calendar.session_minutes(FromDate, ToDate)
         # print(f"Resampling {resample_period} on data size {nifty_datetime.shape[0]}")
-        grouped = df.groupby('Ticker')
+        grouped = df.groupby('Ticker', observed=True)
         processed_data = []
 
         for ticker, data_group in grouped:
             data_merged = nifty_datetime.merge(data_group, how='left', on='DateTime').ffill()
-            resampled_data = data_merged.set_index('DateTime').resample(resample_period).agg({
-                'Expiry': 'first',
-                'Strike': 'first',
-                'Type': 'first',
-                'Open': 'first',
-                'High': 'max',
-                'Low': 'min',
-                'Close': 'last',
-                'Volume': 'sum',
-                'OI': 'last',
-                'Date' : 'first',
-                'Weekday' : 'first',
-                'Underlying' : 'last'
-            }).reset_index()
+            resampled_data = data_merged.set_index('DateTime').resample(resample_period).agg(BAR_AGGREGATIONS).reset_index()
             resampled_data['Ticker'] = ticker
             processed_data.append(resampled_data)
 
         combined_df = pd.concat(processed_data, ignore_index=True)
         return combined_df.dropna(subset=['Close'], axis=0).reset_index(drop=True)
 
-    def fetch_custom_data(self, query, params=[]):
-        return self._execute_query(query, params)
+    def fetch_custom_data(self, query, params=[], output='pandas'):
+        return self._execute_query(query, params, output=output)
 
     def is_trading_date(self, date):
     #   check wheatherr data in db Datetime.Date
-        query = """
-            SELECT DISTINCT CAST(DateTime AS DATE) AS Date
-            FROM data
-            WHERE CAST(DateTime AS DATE) = ?
-        """
-        return self._execute_query(query, [date]).shape[0] > 0
+        return self.calendar.is_session(date)
 
 
 if __name__ == '__main__':
@@ -1,24 +1,56 @@
 import os
+import contextlib
 import pandas as pd
 import numpy as np
 import duckdb
 from abc import ABCMeta, abstractmethod
 import pandas as pd
-import re
 import numpy as np
 import datetime as dt
 import warnings
 warnings.filterwarnings("ignore")
 from OP_BackTest.core import DataFetcher
+from OP_BackTest.core.DataFetch import DATA_COLUMNS
+from OP_BackTest.core.Conditions import ConditionSet
+from OP_BackTest.core.Vectorized import VectorizedLeg
+from OP_BackTest.core.Streaming import StreamingEngine
+from OP_BackTest.core.Sharding import ShardedEngine
+from OP_BackTest.core.TradeBook import TradeBookBuffer
+from OP_BackTest.core.IndicatorCache import IndicatorCache
+from OP_BackTest.core.ConnectionPool import ConnectionPool
+from OP_BackTest.core.Profiler import NULL_PROFILER
+from OP_BackTest.core.ResultCache import dataset_fingerprint
+from OP_BackTest.core.LegExecutor import EXECUTORS, LegProcessPool
 from threading import Thread
-from queue import Queue
 from OP_BackTest.utlis import log_handler
 
 class Engine:
-    def __init__(self, Strategy_parameters,db_path=None,log_path=None):
+    def __init__(self, Strategy_parameters,db_path=None,log_path=None,mode='loop',indicator_cache=None,pool=None,profiler=None,result_cache=None,executor='thread',chain_source=None):
         self.Strategy_parameters = Strategy_parameters
         self.db_path = '../DataDB/data.db' if db_path is None else db_path
-
+        if mode not in ('loop', 'vectorized'):
+            raise ValueError(f"Invalid mode: {mode}. Allowed modes are: ['loop', 'vectorized']")
+        self.mode = mode
+        # Shared by all legs, each ticker series and indicator is computed once per run
+        self.indicator_cache = IndicatorCache() if indicator_cache is None else indicator_cache
+        # None opens the database for each run, shared by its leg threads and closed afterwards. A ConnectionPool
+        # (e.g. ConnectionPool.default_pool) keeps it open across runs and Engines, False for a connection per leg
+        self.pool = pool
+        # StageProfiler timing the stages of each leg and every query, see Profiler.py. Disabled by default
+        self.profiler = NULL_PROFILER if profiler is None else profiler
+        # ResultCache reusing the trade book of legs already run with the same parameters on the same data
+        self.result_cache = result_cache
+        # Legs run in a thread each, in a worker process each (see LegProcessPool) or one after the other
+        if executor not in EXECUTORS:
+            raise ValueError(f"Invalid executor: {executor}. Allowed values are: {EXECUTORS}")
+        if executor == 'process' and indicator_cache is not None:
+            # Worker processes build their own cache, a given one would silently stay empty
+            raise ValueError("indicator_cache cannot be shared with the worker processes of executor='process'")
+        self.executor = executor
+        # Where strikes are picked from instead of each leg's DataFetcher, e.g. the ChainStore of a BatchEngine
+        self.chain_source = chain_source
+
+        self.log_path = log_path
         log_path = "Engine.log" if log_path is None else log_path + "Engine.log"
         loggerC = log_handler.ThreadSafeLogger("Engine", log_path)
         self.logger = loggerC.get_logger()
@@ -47,6 +79,7 @@ class Engine:
 
     def unpack_legs(self):
         self.legs = []
+        self.compiled_conditions = {}
         for leg in self.Legs:
             leg_parameters = {
                 'LegName': leg.get('LegName', 'Leg'),
@@ -62,9 +95,23 @@ class Engine:
                 'EntryConditions': leg.get('EntryConditions', []),
                 'ExitConditions': leg.get('ExitConditions', []),
             }
+            # An unsupported StrikePrice would otherwise only show up as a leg without trades
+            self.strike_rule(leg_parameters['StrikePrice'])
             self.legs.append(leg_parameters)
+            # Parsed once here so that invalid conditions are reported before the run starts
+            entry_conditions = self.compile_conditions(leg_parameters['EntryConditions'], entry=True)
+            exit_conditions = self.compile_conditions(leg_parameters['ExitConditions'])
+            self.logger.info(f"{leg_parameters['LegName']} EntryConditions use {entry_conditions.describe()}, ExitConditions use {exit_conditions.describe()}")
         self.logger.info('Legs Unlocked')
 
+    def compile_conditions(self, conditions, entry=False):
+        # Without conditions every bar is an entry and no bar is a condition exit
+        key = (tuple(conditions), entry)
+        if key not in self.compiled_conditions:
+            columns = DATA_COLUMNS + list(self.Indicator_data)
+            self.compiled_conditions[key] = ConditionSet(conditions, columns, empty=entry)
+        return self.compiled_conditions[key]
+
     def include_indicators(self, data):
         for indicator_name, indicator_params in self.Indicator_data.items():
             indicator_function = indicator_params[0]
@@ -93,27 +140,37 @@ class Engine:
 
 
     def leg_excution(self, leg):
-        Data = DataFetcher(db_path=self.db_path)
-        legTradeBook = pd.DataFrame(columns=['EntryTime', 'Action', 'Ticker', 'EntryPrice', 'Target', 'Stoploss', 'ExitTime', 'ExitPrice', 'ExitReason', 'TotalLot'])
+        Data = DataFetcher(db_path=self.db_path, pool=self.pool or None, profiler=self.profiler)
+        Chain = Data if self.chain_source is None else self.chain_source
+        profiler = self.profiler
+        trades = TradeBookBuffer()
 
         data_fetch_para_par = self.data_fetch_para()
         data_fetch_para_par['Type'] = leg['OptionType']
+        # Strike selection only reads these, the rest of the chain is not loaded
+        chain_columns = list(dict.fromkeys(['DateTime', 'Ticker', 'Type', 'Open', self.EntryType]))
 
         current_trade_entry_date = pd.to_datetime(f'{self.FromDate} {self.EntryTime}')
         last_trade_exit_date = pd.to_datetime(f'{self.ToDate} {self.ExitTime}')
 
         while current_trade_entry_date < last_trade_exit_date:
             current_trade_entry_date = self.adjust_for_next_trade(Data, current_trade_entry_date)
-            print(current_trade_entry_date)
             data_fetch_para = data_fetch_para_par.copy()
             data_fetch_para['DateTime'] = current_trade_entry_date
-            option_data = Data.fetch_options_data(data_fetch_para)
+            with profiler.stage('chain') as stage:
+                option_data = Chain.fetch_chain_snapshot(data_fetch_para, columns=chain_columns)
+                stage.rows = option_data.shape[0]
             if option_data.empty:
                 continue
 
-            strike_price = self.get_strkePrice(leg['StrikePrice'], option_data)
-            start_time, end_time = self.calculate_time(end_time=current_trade_entry_date)
-            strike_data = self.fetch_and_prepare_strike_data(Data, start_time, strike_price['Ticker'])
+            with profiler.stage('strike'):
+                strike_price = self.get_strkePrice(leg['StrikePrice'], option_data)
+            if strike_price is None:
+                continue
+            start_time, end_time = self.calculate_time(end_time=current_trade_entry_date, calendar=Data.calendar)
+            with profiler.stage('series') as stage:
+                strike_data = self.fetch_and_prepare_strike_data(Data, start_time, strike_price['Ticker'])
+                stage.rows = strike_data.shape[0]
 
             if strike_data.empty or strike_data.shape[0] < self.max_window:
                 continue
@@ -121,26 +178,32 @@ class Engine:
             strike_data_pre = strike_data[strike_data['DateTime'] <= current_trade_entry_date]
             strike_data_post = strike_data[strike_data['DateTime'] > current_trade_entry_date]
 
-            if strike_data_post.empty or not self.check_conditions(strike_data_pre, leg['EntryConditions'], entry=True):
+            if strike_data_post.empty:
+                continue
+            with profiler.stage('entry'):
+                entry_signal = self.check_conditions(strike_data_pre, leg['EntryConditions'], entry=True)
+            if not entry_signal:
                 continue
 
             trade_entry = self.prepare_trade_entry(leg, strike_data_pre, current_trade_entry_date)
-            trade_exit = self.determine_trade_exit(leg, trade_entry, strike_data_post)
-            legTradeBook.loc[len(legTradeBook)] = {**trade_entry, **trade_exit}
+            with profiler.stage('exit', rows=strike_data_post.shape[0]):
+                trade_exit = self.determine_trade_exit(leg, trade_entry, strike_data_post)
+            trades.append({**trade_entry, **trade_exit})
 
             current_trade_entry_date = trade_exit['ExitTime']
 
+        legTradeBook = trades.to_frame()
         legTradeBook['LegName'] = leg['LegName']
         legTradeBook['Action'] = leg['ActionType']
         return legTradeBook
 
+    def leg_excution_vectorized(self, leg):
+        # Loads the whole date range of the leg once instead of querying per entry minute
+        return VectorizedLeg(self, leg).run()
+
     def fetch_and_prepare_strike_data(self, Data, start_time, ticker):
-        data_fetch_para = {
-            'FromDate': start_time,
-            'Ticker': ticker,
-        }
-        strike_data = Data.fetch_options_data(data_fetch_para, resample_period=f'{self.TimeFrame}min')
-        return self.include_indicators(strike_data)
+        # Slice of the cached full series, indicators are computed once per ticker instead of per trade
+        return self.indicator_cache.slice(Data, ticker, self.TimeFrame, self.Indicator_data, from_date=start_time)
 
     def prepare_trade_entry(self, leg, strike_data_pre, current_trade_entry_date):
         entry_price = strike_data_pre['Close'].iloc[-1]
@@ -156,24 +219,35 @@ class Engine:
         }
 
     def determine_trade_exit(self, leg, trade_entry, strike_data_post):
-        strike_data_post['Signal'] = self.check_conditions(strike_data_post, leg['ExitConditions'])
+        # Signals are NumPy arrays, strike_data_post (a slice of the cached series) is not written to
+        signal = self.compile_conditions(leg['ExitConditions']).evaluate(strike_data_post)
+        high = strike_data_post['High'].to_numpy()
+        low = strike_data_post['Low'].to_numpy()
         if leg['ActionType'] == 'BUY':
-            strike_data_post['TargetSignal'] = strike_data_post['High'] >= trade_entry['Target']
-            strike_data_post['StoplossSignal'] = strike_data_post['Low'] <= trade_entry['Stoploss']
+            target_signal = high >= trade_entry['Target']
+            stoploss_signal = low <= trade_entry['Stoploss']
         else:
-            strike_data_post['TargetSignal'] = strike_data_post['Low'] <= trade_entry['Target']
-            strike_data_post['StoplossSignal'] = strike_data_post['High'] >= trade_entry['Stoploss']
-
-        strike_data_post['DayEnd'] = strike_data_post['DateTime'].dt.time == pd.to_datetime(self.ExitTime).time()
-
-        strike_data_post['ExitReason'] = np.where(strike_data_post['StoplossSignal'], 'Stoploss',
-                                                  np.where(strike_data_post['TargetSignal'], 'Target',
-                                                           np.where(strike_data_post['Signal'], 'ExitCondition',
-                                                                    np.where(strike_data_post['DayEnd'], 'DayEnd', None))))
+            target_signal = low <= trade_entry['Target']
+            stoploss_signal = high >= trade_entry['Stoploss']
+
+        day_end = (strike_data_post['DateTime'].dt.time == pd.to_datetime(self.ExitTime).time()).to_numpy()
+
+        any_exit = stoploss_signal | target_signal | signal | day_end
+        if not any_exit.any():
+            raise IndexError("No exit bar after the entry")
+        position = int(np.argmax(any_exit))
+        if stoploss_signal[position]:
+            reason = 'Stoploss'
+        elif target_signal[position]:
+            reason = 'Target'
+        elif signal[position]:
+            reason = 'ExitCondition'
+        else:
+            reason = 'DayEnd'
 
-        exit_row = strike_data_post.dropna(subset=['ExitReason']).iloc[0]
+        exit_row = {'ExitReason': reason, 'Close': strike_data_post['Close'].iloc[position]}
         exit_price = self.get_exit_price(exit_row, trade_entry)
-        return {'ExitTime': exit_row['DateTime'], 'ExitPrice': exit_price, 'ExitReason': exit_row['ExitReason']}
+        return {'ExitTime': strike_data_post['DateTime'].iloc[position], 'ExitPrice': exit_price, 'ExitReason': reason}
 
     def get_exit_price(self, exit_row, trade_entry):
         if exit_row['ExitReason'] == 'ExitCondition':
@@ -185,77 +259,34 @@ class Engine:
         elif exit_row['ExitReason'] == 'DayEnd':
             return exit_row['Close']
 
-    def calculate_time(self, end_time=None):
-        end_time = pd.to_datetime(end_time)
-        days = self.max_window // (375 // self.TimeFrame)
-        start_time = end_time - pd.Timedelta(days=days + 1)
-        return start_time,end_time
-
 
     def adjust_for_next_trade(self, Data, exit_time):
         next_entry_time = exit_time + pd.Timedelta(minutes=self.TimeFrame)
         if next_entry_time.time() >= pd.to_datetime(self.ExitTime).time():
-            while True:
-                next_entry_time = next_entry_time + pd.Timedelta(days=1)
-                if Data.is_trading_date(next_entry_time.date()):
-                    break
-            next_entry_time = pd.to_datetime(f'{next_entry_time.date()} {self.EntryTime}')
+            next_session = Data.calendar.next_session(next_entry_time.date())
+            # Past the last session in the data, keep walking calendar days until ToDate is reached
+            next_date = next_session if next_session is not None else (next_entry_time + pd.Timedelta(days=1)).date()
+            next_entry_time = pd.to_datetime(f'{next_date} {self.EntryTime}')
         return next_entry_time
 
     def check_conditions(self, df, conditions,entry = False):
-
-        # Transform each condition using transform_condition
-        transformed_conditions = [self.transform_condition(cond, df) for cond in conditions]
-        # Evaluate all transformed conditions using pandas.eval with local_dict
-        evaluated_conditions = [pd.eval(cond, local_dict={'df': df}, engine='python') for cond in transformed_conditions]
-
-        # Combine all conditions using '&' operator to get the final signal
-        final_signal = evaluated_conditions[0]
-        for cond in evaluated_conditions[1:]:
-            final_signal |= cond
-
+        # Conditions are parsed once per leg, see compile_conditions
+        evaluator = self.compile_conditions(conditions, entry=entry)
         if entry:
             # Return the signal for the last row
-            return final_signal.iloc[-1]
+            return evaluator.evaluate(df, last=True)
         else:
-            return final_signal
-
-    def transform_condition(self, condition, df):
-        # Mapping logical operators to pandas equivalents
-        logical_operators = {
-            ' and ': ' & ',
-            ' or ': ' | ',
-            ' not ': ' ~'
-        }
-
-        transformed_condition = condition
-        # Replace logical operators in the condition
-        for operator, replacement in logical_operators.items():
-            transformed_condition = transformed_condition.replace(operator, replacement)
-
-        # Create a regex pattern to match column names and optional suffixes
-        pattern = re.compile(r'\b(' + '|'.join(df.columns) + r')(_\d+)?\b')
-
-        # Function to replace matched column names with df references
-        def replace_column(match):
-            col = match.group(1)
-            suffix = match.group(2)
-            if suffix:
-                period = int(suffix[1:])
-                return f"df['{col}'].shift({period})"
-            else:
-                return f"df['{col}']"
-
-        # Replace column names in the condition with their corresponding df references
-        transformed_condition = pattern.sub(replace_column, transformed_condition)
-
-        return transformed_condition
-
+            return pd.Series(evaluator.evaluate(df), index=df.index)
 
-    def calculate_time(self, end_time=None):
+    def calculate_time(self, end_time=None, calendar=None):
+        # Lookback start for the indicators, counted in trading sessions when a calendar is given
         end_time = pd.to_datetime(end_time)
         days = self.max_window // (375 // self.TimeFrame)
-        start_time = end_time - pd.Timedelta(days=days + 1)
+        start_session = calendar.shift_session(end_time, -(days + 1)) if calendar is not None else None
+        if start_session is None:
+            start_time = end_time - pd.Timedelta(days=days + 1)
+        else:
+            start_time = pd.to_datetime(f'{start_session} {end_time.time()}')
         return start_time,end_time
 
     def max_window_cal(self):
@@ -266,11 +297,34 @@ class Engine:
                 if 'window' in params:
                     self.max_window = max(self.max_window, params['window'])
 
-    def get_strkePrice(self,condition,df):
+    @staticmethod
+    def strike_rule(condition):
+        """
+        Selection rule and value of a leg StrikePrice, e.g. ('greaterthan', 100).
+
+        ClosestPremium accepts the premium directly or as {'closet': premium}, the form of the default.
+        """
         if 'lessthan' in condition:
-            return df[df[self.EntryType] < condition['lessthan']].iloc[-1]
+            return 'lessthan', condition['lessthan']
         elif 'greaterthan' in condition:
-            return df[df[self.EntryType] > condition['greaterthan']].iloc[0]
+            return 'greaterthan', condition['greaterthan']
+        elif 'ClosestPremium' in condition:
+            premium = condition['ClosestPremium']
+            if isinstance(premium, dict):
+                premium = premium.get('closet', premium.get('closest'))
+            return 'closest', premium
+        raise ValueError(f"Invalid StrikePrice: {condition}. Allowed keys are: ['lessthan', 'greaterthan', 'ClosestPremium']")
+
+    def get_strkePrice(self,condition,df):
+        # None when no strike of the chain matches, like a minute missing from DataFetcher.fetch_strikes_batch
+        rule, value = self.strike_rule(condition)
+        if rule == 'lessthan':
+            df = df[df[self.EntryType] < value]
+            return df.iloc[-1] if not df.empty else None
+        elif rule == 'greaterthan':
+            df = df[df[self.EntryType] > value]
+            return df.iloc[0] if not df.empty else None
+        return df.iloc[(df[self.EntryType] - value).abs().argmin()]
 
     def calculate_profit(self,TradeBook):
         if TradeBook.empty:
@@ -281,37 +335,109 @@ class Engine:
         TradeBook['Drawdown'] = TradeBook['CumulativeProfit'] - TradeBook['CumulativeProfit'].cummax()
         return TradeBook
 
+    @contextlib.contextmanager
+    def connections(self):
+        """
+        Database handle of a run: the pool given to the Engine, or a ConnectionPool opened for the run and
+        closed afterwards, so that no lock on the database file outlives the run.
+        """
+        if self.pool is not None:
+            yield self.pool
+            return
+        self.pool = ConnectionPool()
+        try:
+            yield self.pool
+        finally:
+            pool, self.pool = self.pool, None
+            pool.close()
+
     def run(self):
+        with self.connections():
+            return self._run()
+
+    def _run(self):
         self.logger.info('Engine Run Started')
-        # Queue for collecting results from threads
-        result_queue = Queue()
-
-        # Function to execute leg execution and collect result
-        def execute_leg_and_collect_result(leg):
-            legTradeBook = self.leg_excution(leg)
-            result_queue.put(legTradeBook)
-
-        # List to keep track of threads
-        threads = []
-
-        # Start a thread for each leg
-        for leg in self.legs:
-            # execute_leg_and_collect_result(leg)
-            thread = Thread(target=execute_leg_and_collect_result, args=(leg,))
-            thread.start()
-            threads.append(thread)
-
-        # Wait for all threads to complete
-        for thread in threads:
-            thread.join()
-
-        # Collect results from queue
-        AllTradeBook = pd.DataFrame()
-        while not result_queue.empty():
-            legTradeBook = result_queue.get()
-            AllTradeBook = pd.concat([AllTradeBook, legTradeBook])
-
-        # Calculate profit
-        AllTradeBook = self.calculate_profit(AllTradeBook)
+        with self.profiler.stage('run') as run_stage:
+            # Trade book or exception of every leg, in leg order
+            results = [None] * len(self.legs)
+
+            leg_runner = self.leg_excution_vectorized if self.mode == 'vectorized' else self.leg_excution
+            processes = LegProcessPool(self) if self.executor == 'process' else contextlib.nullcontext()
+            if self.executor == 'process':
+                # The leg threads only wait for their worker process
+                leg_runner = processes.run_leg
+            if self.result_cache is not None:
+                # Taken once per run, the data may have been topped up since the last one
+                fingerprint = dataset_fingerprint(self.db_path)
+                compute_leg = leg_runner
+                leg_runner = lambda leg: self.result_cache.leg_result(self, leg, compute_leg, fingerprint)
+
+            # Function to execute leg execution and collect result
+            def execute_leg_and_collect_result(position, leg):
+                try:
+                    with self.profiler.leg(leg['LegName']), self.profiler.stage('leg') as stage:
+                        legTradeBook = leg_runner(leg)
+                        stage.rows = legTradeBook.shape[0]
+                    results[position] = (legTradeBook, None)
+                except Exception as error:
+                    # Raised by the run once every leg is done, a thread would only print it
+                    self.logger.error(f"{leg['LegName']} failed: {type(error).__name__}: {error}")
+                    results[position] = (None, error)
+
+            with processes:
+                if self.executor == 'serial':
+                    for position, leg in enumerate(self.legs):
+                        execute_leg_and_collect_result(position, leg)
+                else:
+                    # List to keep track of threads
+                    threads = []
+
+                    # Start a thread for each leg
+                    for position, leg in enumerate(self.legs):
+                        thread = Thread(target=execute_leg_and_collect_result, args=(position, leg), name=f"Leg-{leg['LegName']}")
+                        thread.start()
+                        threads.append(thread)
+
+                    # Wait for all threads to complete
+                    for thread in threads:
+                        thread.join()
+
+            # A failed leg fails the run, rather than a trade book without its trades
+            for legTradeBook, error in results:
+                if error is not None:
+                    raise error
+            AllTradeBook = TradeBookBuffer.combine(legTradeBook for legTradeBook, _ in results)
+
+            # Calculate profit
+            AllTradeBook = self.calculate_profit(AllTradeBook)
+            run_stage.rows = AllTradeBook.shape[0]
+        if self.profiler.enabled:
+            self.logger.info('Stage profile\n' + self.profiler.summary().to_string(index=False))
         self.logger.info('Engine Run Completed')
-        return AllTradeBook
\ No newline at end of file
+        return AllTradeBook
+
+    def stream(self, chunk='day', memory_budget=None):
+        """
+        Runs the strategy one trading day or expiry week at a time with bounded memory, see StreamingEngine.
+
+        Yields:
+        -------
+        pd.DataFrame
+            Trades in ExitTime order, same columns as run().
+        """
+        self.logger.info('Engine Stream Started')
+        with self.connections():
+            yield from StreamingEngine(self, chunk=chunk, memory_budget=memory_budget).trades()
+        self.logger.info('Engine Stream Completed')
+
+    def run_sharded(self, max_workers=None, weeks_per_shard=1):
+        """
+        Runs the expiry weeks of the date range in parallel worker processes, see ShardedEngine.
+
+        Returns:
+        --------
+        pd.DataFrame
+            Same trade book as run().
+        """
+        with self.connections():
+            return ShardedEngine(self, max_workers=max_workers, weeks_per_shard=weeks_per_shard).run()
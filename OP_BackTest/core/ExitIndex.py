@@ -0,0 +1,82 @@
+import numpy as np
+
+
+def _sparse_table(values, combine):
+    # levels[k][i] = combine of values[i:i + 2**k], every level half the span of the next
+    levels = [values]
+    span = 1
+    while 2 * span <= values.shape[0]:
+        previous = levels[-1]
+        levels.append(combine(previous[:-span], previous[span:]))
+        span *= 2
+    return levels
+
+
+class ExitIndex:
+    """
+    First-passage index over one ticker series, built once and queried for every trade on it.
+
+    Sparse tables of the running maximum of High and minimum of Low answer "first bar at or after
+    `start` whose High reaches a level" (and the Low counterpart) with one descent over the power-of-two
+    blocks, O(log n) per query whatever the entry price, target and stoploss are. The exit-condition and
+    day-end bars are kept as sorted positions, the next one after a bar is a binary search.
+
+    NaN prices never reach a level, like the comparisons of Engine.determine_trade_exit.
+
+    Attributes:
+    -----------
+    size : int
+        Number of bars of the series.
+    """
+
+    def __init__(self, high, low, signal, day_end):
+        high = np.asarray(high)
+        low = np.asarray(low)
+        self.size = high.shape[0]
+        # fmax / fmin skip NaN, a block is NaN only when all its bars are
+        self._high = _sparse_table(high, np.fmax)
+        self._low = _sparse_table(low, np.fmin)
+        self._signal = np.flatnonzero(np.asarray(signal, dtype=bool))
+        self._day_end = np.flatnonzero(np.asarray(day_end, dtype=bool))
+
+    def _first(self, levels, start, reached):
+        position = start
+        if position >= self.size:
+            return None
+        # Skip every block lying entirely before the answer, largest blocks first
+        for level in range(len(levels) - 1, -1, -1):
+            values = levels[level]
+            if position < values.shape[0] and not reached(values[position]):
+                position += 1 << level
+                if position >= self.size:
+                    return None
+        return position
+
+    def first_high_at_least(self, start, level):
+        """
+        Position of the first bar at or after start with High >= level, None when there is none.
+        """
+        return self._first(self._high, start, lambda value: value >= level)
+
+    def first_low_at_most(self, start, level):
+        """
+        Position of the first bar at or after start with Low <= level, None when there is none.
+        """
+        return self._first(self._low, start, lambda value: value <= level)
+
+    @staticmethod
+    def _next(positions, start):
+        index = np.searchsorted(positions, start, side='left')
+        return int(positions[index]) if index < positions.shape[0] else None
+
+    def next_signal(self, start):
+        """
+        Position of the first exit-condition bar at or after start, None when there is none.
+        """
+        return self._next(self._signal, start)
+
+    def next_day_end(self, start):
+        """
+        Position of the first day-end bar at or after start, None when there is none.
+        """
+        return self._next(self._day_end, start)
@@ -0,0 +1,153 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+
+class IndicatorCache:
+    """
+    Memory-bounded cache of resampled ticker series and their indicator columns.
+
+    Every ticker is fetched and resampled once per TimeFrame, and every indicator is computed once
+    over that full series. Trades then receive a slice of the cached series by time range, so adding
+    indicators to `Indicator_data` does not add per-trade work.
+
+    Entries are keyed by (Ticker, TimeFrame) for the bars and by
+    (Ticker, TimeFrame, indicator class, inputs, params, output method) for the indicator columns.
+    When the total size goes over max_bytes the least recently used entries are evicted.
+
+    Attributes:
+    -----------
+    max_bytes : int
+        Memory budget for all cached bars and indicator columns.
+    nbytes : int
+        Current size of the cached entries.
+    hits : int
+        Number of lookups served from memory.
+    misses : int
+        Number of lookups which needed a fetch or a computation.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def indicator_key(ticker, time_frame, indicator_function, indicator_columns, params, method_name):
+        return (ticker, time_frame, f'{indicator_function.__module__}.{indicator_function.__qualname__}',
+                tuple(indicator_columns), tuple(sorted((key, repr(value)) for key, value in params.items())), method_name)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def _put(self, key, value, nbytes):
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[1]
+        self._entries[key] = (value, nbytes)
+        self.nbytes += nbytes
+        # Keep at least the entry just added, even when it alone is over the budget
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.nbytes -= evicted
+
+    def bars(self, Data, ticker, time_frame):
+        """
+        Full resampled history of ticker, fetched once per TimeFrame.
+        """
+        key = (ticker, time_frame)
+        with self._lock:
+            bars = self._get(key)
+        if bars is None:
+            with Data.profiler.stage('resample') as stage:
+                bars = Data.fetch_options_data({'Ticker': ticker}, resample_period=f'{time_frame}min')
+                stage.rows = bars.shape[0]
+            with self._lock:
+                self._put(key, bars, int(bars.memory_usage(deep=True).sum()))
+        return bars
+
+    def prefetch(self, Data, tickers, time_frame):
+        """
+        Loads the bars of the tickers not cached yet with one query, see DataFetcher.fetch_ticker_bars.
+
+        Returns:
+        --------
+        int
+            Number of tickers loaded.
+        """
+        with self._lock:
+            missing = [ticker for ticker in dict.fromkeys(tickers) if (ticker, time_frame) not in self._entries]
+        if not missing:
+            return 0
+        with Data.profiler.stage('resample') as stage:
+            frames = Data.fetch_ticker_bars(missing, f'{time_frame}min')
+            stage.rows = sum(bars.shape[0] for bars in frames.values())
+        with self._lock:
+            for ticker, bars in frames.items():
+                self._put((ticker, time_frame), bars, int(bars.memory_usage(deep=True).sum()))
+        return len(frames)
+
+    def indicator(self, Data, ticker, time_frame, indicator_function, indicator_columns, params, method_name):
+        """
+        One indicator output over the full resampled history of ticker, rounded like Engine.include_indicators.
+        """
+        key = self.indicator_key(ticker, time_frame, indicator_function, indicator_columns, params, method_name)
+        with self._lock:
+            values = self._get(key)
+        if values is None:
+            bars = self.bars(Data, ticker, time_frame)
+            if bars.empty:
+                values = np.array([], dtype=np.float64)
+            else:
+                with Data.profiler.stage('indicator', rows=bars.shape[0]):
+                    indicator_instance = indicator_function(*[bars[col] for col in indicator_columns], **params)
+                    values = np.asarray(round(getattr(indicator_instance, method_name)(), 3))
+            with self._lock:
+                self._put(key, values, int(values.nbytes))
+        return values
+
+    def series(self, Data, ticker, time_frame, Indicator_data):
+        """
+        Full resampled history of ticker with one column per entry of Indicator_data.
+        """
+        return self.slice(Data, ticker, time_frame, Indicator_data)
+
+    def slice(self, Data, ticker, time_frame, Indicator_data, from_date=None, to_date=None):
+        """
+        Rows of the cached series with from_date <= DateTime <= to_date, indexed from 0.
+
+        Like Engine.include_indicators, when an indicator lists several parameter sets or output methods
+        the column holds the last one, so only that one is computed.
+        """
+        bars = self.bars(Data, ticker, time_frame)
+        start, stop = 0, bars.shape[0]
+        if not bars.empty:
+            times = bars['DateTime'].to_numpy()
+            if from_date is not None:
+                start = np.searchsorted(times, np.datetime64(pd.to_datetime(from_date)), side='left')
+            if to_date is not None:
+                stop = np.searchsorted(times, np.datetime64(pd.to_datetime(to_date)), side='right')
+
+        data = bars.iloc[start:stop].reset_index(drop=True)
+        for indicator_name, indicator_params in Indicator_data.items():
+            indicator_function, indicator_columns, indicator_params_list, methods = indicator_params[:4]
+            if not indicator_params_list or not methods:
+                continue
+            values = self.indicator(Data, ticker, time_frame, indicator_function, indicator_columns,
+                                    indicator_params_list[-1], methods[-1])
+            data[indicator_name] = values[start:stop]
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
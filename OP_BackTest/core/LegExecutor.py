@@ -0,0 +1,120 @@
+import contextlib
+import logging.handlers
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pyarrow as pa
+from OP_BackTest.core.DataFetch import DataFetcher
+from OP_BackTest.core.Profiler import StageProfiler
+from OP_BackTest.utlis.log_handler import ThreadSafeLogger
+
+# How Engine.run executes the legs of a strategy
+EXECUTORS = ['thread', 'process', 'serial']
+
+
+def to_ipc(trade_book):
+    """
+    Trade book as an Arrow IPC stream, the form in which worker processes return it.
+    """
+    table = pa.Table.from_pandas(trade_book, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def from_ipc(buffer):
+    return pa.ipc.open_stream(buffer).read_all().to_pandas()
+
+
+def _init_worker(log_queue):
+    # Records of the worker's loggers go to the parent, which writes them to its own log file
+    ThreadSafeLogger.forward_to(log_queue)
+
+
+def _run_leg(parameters, leg, db_path, log_path, mode, chain_path=None, profile=False):
+    # Runs in a worker process, on the worker's own read-only connection and indicator cache. Returns the
+    # trade book and, when profiling, the records of the worker's StageProfiler
+    from OP_BackTest.core.Engine import Engine
+    profiler = StageProfiler() if profile else None
+    chain_source = None if chain_path is None else DataFetcher(db_path=chain_path, profiler=profiler)
+    engine = Engine(parameters, db_path=db_path, log_path=log_path, mode=mode, profiler=profiler,
+                    executor='serial', chain_source=chain_source)
+    leg_runner = engine.leg_excution_vectorized if mode == 'vectorized' else engine.leg_excution
+    with engine.profiler.leg(leg['LegName']):
+        trade_book = leg_runner(leg)
+    return to_ipc(trade_book), None if profiler is None else profiler.records()
+
+
+@contextlib.contextmanager
+def worker_pool(logger, max_workers=None):
+    """
+    ProcessPoolExecutor of spawned workers whose log records are written by logger, see
+    ThreadSafeLogger.forward_to. Spawned workers open the database on their own instead of inheriting
+    the parent's DuckDB handle.
+    """
+    context = multiprocessing.get_context('spawn')
+    log_queue = context.Queue()
+    # A Logger has the handle() of a Handler, records are passed on to its file handler
+    listener = logging.handlers.QueueListener(log_queue, logger)
+    listener.start()
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(log_queue,)) as executor:
+            yield executor
+    finally:
+        listener.stop()
+
+
+class LegProcessPool:
+    """
+    Worker processes running the legs of an Engine, one process per leg.
+
+    Legs run in threads serialise on the GIL; in processes a four-leg strategy uses four cores. Workers
+    are spawned rather than forked, so they open the database read-only on their own instead of
+    inheriting the parent's DuckDB handle, and build their own indicator cache. Trade books come back as
+    Arrow IPC buffers (to_ipc), log records through a queue to the parent's ThreadSafeLogger.
+
+    Strategy_parameters are sent to the workers, indicator classes must be importable (not defined in
+    `__main__`), and a script running the engine needs the `if __name__ == '__main__':` guard.
+
+    The other options of the engine carry over: the result cache is looked up in the parent before a leg
+    is sent, the stages profiled in a worker are merged into the engine's StageProfiler, and a chain
+    source with an Arrow file (the ChainStore of a BatchEngine) is read by the workers from its path.
+    An IndicatorCache cannot be shared with the workers, see Engine.
+
+    Attributes:
+    -----------
+    engine : Engine
+        Engine whose legs are run, its logger receives the records of the workers.
+    max_workers : int
+        Worker processes, the number of legs by default.
+    """
+
+    def __init__(self, engine, max_workers=None):
+        if engine.chain_source is not None and getattr(engine.chain_source, 'path', None) is None:
+            raise ValueError("A chain_source is only read by worker processes from its Arrow file, e.g. a ChainStore")
+        self.engine = engine
+        self.max_workers = max_workers or max(len(engine.legs), 1)
+        self._pool = None
+        self._executor = None
+
+    def __enter__(self):
+        self._pool = worker_pool(self.engine.logger, self.max_workers)
+        self._executor = self._pool.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._pool.__exit__(exc_type, exc_value, traceback)
+
+    def run_leg(self, leg):
+        """
+        Trade book of leg, computed in a worker process. Blocks until the worker is done.
+        """
+        engine = self.engine
+        chain_path = None if engine.chain_source is None else engine.chain_source.path
+        future = self._executor.submit(_run_leg, engine.Strategy_parameters, leg, engine.db_path,
+                                       engine.log_path, engine.mode, chain_path, engine.profiler.enabled)
+        trade_book, records = future.result()
+        if records is not None:
+            engine.profiler.merge(records)
+        return from_ipc(trade_book)
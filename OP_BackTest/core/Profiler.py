@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+import time
+import pandas as pd
+
+
+class _Stage:
+    # One timed block of StageProfiler.stage. Set `rows` inside the block to record the rows it handled.
+    __slots__ = ('profiler', 'name', 'leg', 'rows', 'start')
+
+    def __init__(self, profiler, name, leg, rows):
+        self.profiler = profiler
+        self.name = name
+        self.leg = leg
+        self.rows = rows
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler._record(self.name, self.leg, self.rows, self.start, time.perf_counter())
+        return False
+
+
+class _NullStage:
+    # Shared no-op block of a disabled profiler, attributes set on it are dropped
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+class _NullLeg:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+_NULL_LEG = _NullLeg()
+
+
+class _Leg:
+    # Attributes the stages of the calling thread to a leg while active
+    __slots__ = ('local', 'name', 'previous')
+
+    def __init__(self, local, name):
+        self.local = local
+        self.name = name
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = getattr(self.local, 'leg', None)
+        self.local.leg = self.name
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.local.leg = self.previous
+        return False
+
+
+class NullProfiler:
+    """
+    Disabled profiler, the default of Engine and DataFetcher. Every hook returns a shared no-op object,
+    so instrumented code pays one method call per stage.
+    """
+    enabled = False
+
+    def stage(self, name, leg=None, rows=None):
+        return _NULL_STAGE
+
+    def leg(self, name):
+        return _NULL_LEG
+
+
+class StageProfiler(NullProfiler):
+    """
+    Wall time, call and row counts of the stages of a backtest, per stage and per leg.
+
+    Stages are timed with `with profiler.stage('query') as stage: ...; stage.rows = len(df)`. Stages run
+    inside `with profiler.leg('LegCE'):` are attributed to that leg, per thread, so the leg threads of
+    Engine.run are told apart. Stages may nest; a stage's time includes its nested stages.
+
+    Stages recorded by the engine:
+        run, leg: Engine.run and one leg, end to end. chunk: one leg over one chunk of Engine.stream.
+        query: every DuckDB query of DataFetcher, with the rows returned.
+        chain, strike: option chain snapshot and strike selection of an entry minute (loop mode),
+            strikes: strike of every minute of the range (vectorized mode).
+        resample: 1-minute rows to TimeFrame bars of a ticker, indicator: one indicator over a ticker.
+        series: bars and indicators of an entry (loop mode), or of a ticker with its entry and exit
+            signals (vectorized mode).
+        entry: entry condition check of an entry minute (loop mode).
+        exit: exit search of a trade.
+        shard: stitching of the leg books of one shard of Engine.run_sharded, with the trades kept.
+        prefetch: chain export and ticker loading of a BatchEngine, with the tickers loaded.
+
+    Attributes:
+    -----------
+    max_events : int
+        Stage calls kept for chrome_trace, the summary counts every call.
+    """
+    enabled = True
+
+    def __init__(self, max_events=1_000_000):
+        self.max_events = max_events
+        self._totals = {}
+        self._events = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def stage(self, name, leg=None, rows=None):
+        return _Stage(self, name, leg if leg is not None else getattr(self._local, 'leg', None), rows)
+
+    def leg(self, name):
+        return _Leg(self._local, name)
+
+    def _record(self, name, leg, rows, start, stop):
+        seconds = stop - start
+        thread = threading.current_thread()
+        with self._lock:
+            totals = self._totals.get((name, leg))
+            if totals is None:
+                totals = self._totals[(name, leg)] = [0, 0, 0.0, 0.0]
+            totals[0] += 1
+            totals[1] += rows or 0
+            totals[2] += seconds
+            totals[3] = max(totals[3], seconds)
+            if len(self._events) < self.max_events:
+                self._events.append((name, leg, rows, start - self._origin, seconds, os.getpid(), thread.ident, thread.name))
+
+    def records(self):
+        """
+        Totals and stage calls recorded so far, in the form merge takes, e.g. to return them from a worker process.
+        """
+        with self._lock:
+            return {'totals': {key: list(totals) for key, totals in self._totals.items()},
+                    'events': [(name, leg, rows, start + self._origin, *rest) for name, leg, rows, start, *rest in self._events]}
+
+    def merge(self, records):
+        """
+        Adds records of another profiler, e.g. of the worker processes of executor='process'. perf_counter
+        is system-wide, so their stage calls line up with the ones of this profiler in chrome_trace.
+        """
+        with self._lock:
+            for key, (calls, row_count, total, longest) in records['totals'].items():
+                totals = self._totals.get(key)
+                if totals is None:
+                    totals = self._totals[key] = [0, 0, 0.0, 0.0]
+                totals[0] += calls
+                totals[1] += row_count
+                totals[2] += total
+                totals[3] = max(totals[3], longest)
+            for name, leg, rows, start, *rest in records['events'][:max(self.max_events - len(self._events), 0)]:
+                self._events.append((name, leg, rows, start - self._origin, *rest))
+
+    def summary(self):
+        """
+        One row per stage and leg (None for stages outside a leg), slowest first.
+
+        Returns:
+        --------
+        pd.DataFrame
+            Stage, Leg, Calls, Rows, TotalSeconds, MeanSeconds, MaxSeconds.
+        """
+        with self._lock:
+            rows = [(name, leg, calls, row_count, total, total / calls, longest)
+                    for (name, leg), (calls, row_count, total, longest) in self._totals.items()]
+        summary = pd.DataFrame(rows, columns=['Stage', 'Leg', 'Calls', 'Rows', 'TotalSeconds', 'MeanSeconds', 'MaxSeconds'])
+        return summary.sort_values(by='TotalSeconds', ascending=False).reset_index(drop=True)
+
+    def chrome_trace(self, path):
+        """
+        Writes the recorded stages as Chrome trace JSON, to open in chrome://tracing or Perfetto.
+        """
+        with self._lock:
+            events = list(self._events)
+        trace = []
+        threads = {}
+        for name, leg, rows, start, seconds, process_id, thread_id, thread_name in events:
+            threads[(process_id, thread_id)] = thread_name
+            args = {}
+            if leg is not None:
+                args['leg'] = leg
+            if rows is not None:
+                args['rows'] = rows
+            trace.append({'name': name, 'cat': leg or 'engine', 'ph': 'X', 'ts': start * 1e6, 'dur': seconds * 1e6,
+                          'pid': process_id, 'tid': thread_id, 'args': args})
+        for (process_id, thread_id), thread_name in threads.items():
+            trace.append({'name': 'thread_name', 'ph': 'M', 'pid': process_id, 'tid': thread_id, 'args': {'name': thread_name}})
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, file)
+        return path
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+            self._events.clear()
+            self._origin = time.perf_counter()
+
+
+# Shared disabled profiler
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,140 @@
+import pandas as pd
+
+# Aggregation of every column of a resampled bar, in the column order of the pandas resampling
+BAR_AGGREGATIONS = {
+    'Expiry': 'first',
+    'Strike': 'first',
+    'Type': 'first',
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Volume': 'sum',
+    'OI': 'last',
+    'Date': 'first',
+    'Weekday': 'first',
+    'Underlying': 'last'
+}
+
+BAR_COLUMNS = ['DateTime', *BAR_AGGREGATIONS, 'Ticker']
+
+# NIFTY index minutes, the spine every ticker is forward filled on
+SPINE_QUERY = "SELECT DISTINCT DateTime FROM data WHERE Ticker = 'NIFTY'"
+
+# pandas treats NaN as missing when forward filling, DuckDB only NULL
+_FLOAT_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Strike']
+
+# Result types of the pandas resampling, the forward filled OI and Weekday come out as floats
+_BAR_TYPES = {'Volume': 'INTEGER', 'OI': 'DOUBLE', 'Weekday': 'DOUBLE'}
+
+
+def period_minutes(resample_period):
+    """
+    Length of a pandas resample period such as '3min' or '1h' in minutes, None when it is not whole minutes.
+    """
+    try:
+        seconds = pd.to_timedelta(resample_period).total_seconds()
+    except ValueError:
+        return None
+    minutes, rest = divmod(seconds, 60)
+    return int(minutes) if minutes >= 1 and not rest else None
+
+
+def complete_row(row, bar):
+    """
+    SQL condition on a 1-minute row the forward fill can restart from: every bar column has a value,
+    or has none in `bar`, a later bar of the ticker on or after the row, so none before either.
+    """
+    def known(column):
+        present = f"{row}.{column} IS NOT NULL" + (f" AND NOT isnan({row}.{column})" if column in _FLOAT_COLUMNS else '')
+        # Summed columns are never NULL in a bar
+        return present if BAR_AGGREGATIONS[column] == 'sum' else f"({present} OR {bar}.{column} IS NULL)"
+    return ' AND '.join(known(column) for column in BAR_AGGREGATIONS)
+
+
+def _aggregate(column, how):
+    if how == 'first':
+        expression = f"arg_min({column}, DateTime) FILTER (WHERE {column} IS NOT NULL)"
+    elif how == 'last':
+        expression = f"arg_max({column}, DateTime) FILTER (WHERE {column} IS NOT NULL)"
+    elif how == 'sum':
+        expression = f"COALESCE(SUM({column}), 0)"
+    else:
+        expression = f"{how.upper()}({column})"
+    if column in _BAR_TYPES:
+        expression = f"CAST({expression} AS {_BAR_TYPES[column]})"
+    return f"{expression} AS {column}"
+
+
+def resample_query(rows, minutes, spine=SPINE_QUERY, window=False):
+    """
+    SQL resampling of 1-minute rows into bars of `minutes` minutes, same result as the pandas
+    resampling of DataFetcher.fetch_and_resample_data.
+
+    Every ticker is put on the spine minutes and forward filled, then grouped into buckets starting at
+    midnight of its first spine day, like pandas resample does. Bars without a Close are dropped.
+
+    Parameters:
+    -----------
+    rows : str
+        Table name or parenthesised query with the 1-minute rows (DATA_COLUMNS).
+    minutes : int
+        Bar length.
+    spine : str
+        Query returning the spine minutes in a DateTime column.
+    window : bool
+        False to put each ticker on the spine between its own first and last row, the whole ticker
+        history of the bar tables. True to put all tickers on the spine between FromDate and ToDate,
+        given as the two parameters following the ones of rows; None stands for the first / last row.
+
+    Returns:
+    --------
+    str
+        Query returning BAR_COLUMNS ordered by Ticker and DateTime.
+    """
+    def value(column):
+        if column in _FLOAT_COLUMNS:
+            return f"CASE WHEN isnan(d.{column}) THEN NULL ELSE d.{column} END"
+        return f"d.{column}"
+
+    if window:
+        bounds = """
+            SELECT Ticker,
+                   COALESCE(CAST(? AS TIMESTAMP), MIN(MIN(DateTime)) OVER ()) AS FromDate,
+                   COALESCE(CAST(? AS TIMESTAMP), MAX(MAX(DateTime)) OVER ()) AS ToDate
+            FROM rows GROUP BY Ticker
+        """
+    else:
+        bounds = "SELECT Ticker, MIN(DateTime) AS FromDate, MAX(DateTime) AS ToDate FROM rows GROUP BY Ticker"
+    filled = ',\n'.join(f"last_value({value(column)} IGNORE NULLS) OVER w AS {column}" for column in BAR_AGGREGATIONS)
+    aggregated = ',\n'.join(_aggregate(column, how) for column, how in BAR_AGGREGATIONS.items())
+    return f"""
+        WITH rows AS (
+            SELECT * FROM {rows}
+        ),
+        bounds AS (
+            {bounds}
+        ),
+        grid AS (
+            SELECT b.Ticker, m.DateTime
+            FROM bounds b JOIN ({spine}) m ON m.DateTime >= b.FromDate AND m.DateTime <= b.ToDate
+        ),
+        filled AS (
+            SELECT g.Ticker, g.DateTime,
+                   date_trunc('day', MIN(g.DateTime) OVER (PARTITION BY g.Ticker)) AS Origin,
+                   {filled}
+            FROM grid g LEFT JOIN rows d ON d.Ticker = g.Ticker AND d.DateTime = g.DateTime
+            WINDOW w AS (PARTITION BY g.Ticker ORDER BY g.DateTime ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+        ),
+        bars AS (
+            SELECT time_bucket(INTERVAL '{int(minutes)} minutes', DateTime, Origin) AS Bucket,
+                   {aggregated},
+                   Ticker
+            FROM filled
+            GROUP BY Ticker, Bucket
+        )
+        SELECT Bucket AS DateTime, {', '.join(BAR_COLUMNS[1:])}
+        FROM bars
+        WHERE Close IS NOT NULL
+        ORDER BY Ticker, DateTime
+    """
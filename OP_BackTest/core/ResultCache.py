@@ -0,0 +1,175 @@
+import hashlib
+import inspect
+import json
+import os
+import pathlib
+import threading
+import numpy as np
+import pandas as pd
+
+# Bumped when the engine changes the trades it produces, so that older entries are not reused
+CACHE_VERSION = 1
+
+# Strategy parameters every leg result depends on, the legs themselves are keyed one by one
+STRATEGY_KEYS = ['TimeFrame', 'EntryTime', 'ExitTime', 'EntryType', 'ExpiryEntryDate', 'ExpiryExitDate',
+                 'FromDate', 'ToDate', 'ExpiryType', 'Indicator_data']
+
+_source_hashes = {}
+
+
+def _source_hash(obj):
+    # Hash of the source code of a class or function, None when it has no Python source
+    if obj not in _source_hashes:
+        try:
+            source = inspect.getsource(obj)
+        except (OSError, TypeError):
+            source = None
+        _source_hashes[obj] = None if source is None else hashlib.sha256(source.encode()).hexdigest()
+    return _source_hashes[obj]
+
+
+def canonical(value):
+    """
+    JSON-serialisable form of a strategy parameter, equal for equal parameters.
+
+    Dicts are sorted by key, tuples become lists, NumPy scalars Python numbers and timestamps ISO strings.
+    Classes and functions, e.g. indicator classes of Indicator_data, are identified by their qualified name
+    and the hash of their source, so editing an indicator invalidates the results computed with it.
+    """
+    if isinstance(value, dict):
+        return {str(key): canonical(value[key]) for key in sorted(value, key=str)}
+    if isinstance(value, (list, tuple)):
+        return [canonical(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, pd.Timedelta)):
+        return value.isoformat()
+    if inspect.isclass(value) or inspect.isfunction(value) or inspect.ismethod(value):
+        return {'callable': f'{value.__module__}.{value.__qualname__}', 'source': _source_hash(value)}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value)
+
+
+def dataset_fingerprint(db_path):
+    """
+    Fingerprint of a DuckDB file, Arrow file or Parquet dataset directory: path, size and modification
+    time of its files. Loading new data (CreateDB) changes it.
+    """
+    path = pathlib.Path(db_path).resolve()
+    files = sorted(p for p in path.rglob('*') if p.is_file()) if path.is_dir() else [path]
+    digest = hashlib.sha256()
+    for file in files:
+        stat = file.stat()
+        digest.update(f'{file}|{stat.st_size}|{stat.st_mtime_ns}\n'.encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk cache of leg trade books, keyed by the strategy parameters and the dataset.
+
+    Every leg is stored on its own as a Parquet file named by the hash of the canonical strategy
+    parameters (STRATEGY_KEYS), the leg parameters and the dataset fingerprint. Changing one leg only
+    recomputes that leg, changing a common parameter, an indicator's code or the data recomputes all.
+
+    Reads refresh the modification time of an entry; when the files go over max_bytes the least
+    recently used entries are removed.
+
+    Attributes:
+    -----------
+    cache_dir : str
+        Folder of the Parquet files, created if missing. Several processes may share it.
+    max_bytes : int
+        Size budget of the folder.
+    hits : int
+        Legs served from the cache.
+    misses : int
+        Legs which had to be computed.
+    """
+
+    def __init__(self, cache_dir, max_bytes=1024 ** 3):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def leg_key(self, engine, leg, fingerprint=None):
+        """
+        Cache key of one leg of engine, see Engine.unpack_legs for the leg parameters.
+
+        fingerprint is dataset_fingerprint(engine.db_path), taken once per run by Engine.run.
+        """
+        payload = {
+            'version': CACHE_VERSION,
+            'strategy': canonical({key: getattr(engine, key) for key in STRATEGY_KEYS}),
+            'leg': canonical(leg),
+            'dataset': dataset_fingerprint(engine.db_path) if fingerprint is None else fingerprint,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / f'{key}.parquet'
+
+    def get(self, key):
+        """
+        Trade book stored under key, None when missing.
+        """
+        path = self._path(key)
+        try:
+            trade_book = pd.read_parquet(path)
+            os.utime(path)
+        except (FileNotFoundError, OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return trade_book
+
+    def put(self, key, trade_book):
+        path = self._path(key)
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        trade_book.reset_index(drop=True).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the folder is within max_bytes.
+        """
+        entries = []
+        for path in self.cache_dir.glob('*.parquet'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for path in self.cache_dir.glob('*.parquet'):
+            path.unlink(missing_ok=True)
+
+    def leg_result(self, engine, leg, run_leg, fingerprint=None):
+        """
+        Trade book of leg from the cache, or computed with run_leg(leg) and stored.
+        """
+        key = self.leg_key(engine, leg, fingerprint)
+        trade_book = self.get(key)
+        if trade_book is None:
+            trade_book = run_leg(leg)
+            self.put(key, trade_book)
+        else:
+            engine.logger.info(f"{leg['LegName']} : trade book read from the result cache")
+        return trade_book
@@ -0,0 +1,154 @@
+import os
+import pandas as pd
+from OP_BackTest.core.ConnectionPool import default_pool
+from OP_BackTest.core.DataFetch import DataFetcher
+from OP_BackTest.core.IndicatorCache import IndicatorCache
+from OP_BackTest.core.LegExecutor import from_ipc, to_ipc, worker_pool
+from OP_BackTest.core.Streaming import StreamingEngine
+from OP_BackTest.core.TradeBook import TradeBookBuffer
+from OP_BackTest.core.Vectorized import VectorizedLeg
+
+# One indicator cache per worker process and database, reused by every shard the worker runs
+_worker_caches = {}
+
+
+def _run_shard(parameters, db_path, log_path, shard):
+    # Runs in a worker process: every leg walked over the shard, like mode='vectorized'
+    from OP_BackTest.core.Engine import Engine
+    indicator_cache = _worker_caches.setdefault(db_path, IndicatorCache())
+    # The worker ends with the run, its connection is kept for the shards it runs
+    engine = Engine(parameters, db_path=db_path, log_path=log_path, mode='vectorized',
+                    indicator_cache=indicator_cache, pool=default_pool, executor='serial')
+    results = []
+    for leg in engine.legs:
+        vectorized = VectorizedLeg(engine, leg)
+        strikes = vectorized.select_strikes(from_date=shard['from_date'], to_date=shard['to_date'])
+        trades, resume = vectorized.walk(strikes, shard['start'], stop=shard['stop'])
+        results.append((to_ipc(vectorized.trade_book(trades)), resume))
+    return results
+
+
+class ShardedEngine:
+    """
+    Parallel run of an Engine over a long date range, one shard of expiry weeks per worker process.
+
+    Trades exit at the latest at the ExitTime of their day, so the legs of one expiry week do not depend
+    on the trades of the previous weeks. The range is cut at the expiry weeks of StreamingEngine.chunks
+    and every shard is walked from its first session on its own, in a worker process with its own
+    read-only connection. Tickers are fetched over their whole history, so indicators are warmed up
+    exactly as in a single run.
+
+    The leg books are stitched in shard order before Engine.calculate_profit. Where a leg of a shard
+    ended inside a trade exiting after the next shard started (no exit bar on its day), the leg of the
+    next shard is walked again in the parent from that exit, dropping the overlapping trades. The trade
+    book is the same as the one of Engine.run.
+
+    Strategy_parameters are sent to the workers, see LegProcessPool for the requirements.
+
+    Attributes:
+    -----------
+    engine : Engine
+        Engine holding the strategy parameters. Legs are simulated like mode='vectorized'.
+    max_workers : int
+        Worker processes, os.cpu_count() by default.
+    weeks_per_shard : int
+        Expiry weeks of one shard.
+    """
+
+    def __init__(self, engine, max_workers=None, weeks_per_shard=1):
+        if weeks_per_shard < 1:
+            raise ValueError("weeks_per_shard must be at least 1")
+        self.engine = engine
+        self.max_workers = max_workers or os.cpu_count()
+        self.weeks_per_shard = weeks_per_shard
+        self.Data = DataFetcher(db_path=engine.db_path, pool=engine.pool or None, profiler=engine.profiler)
+
+    def shards(self):
+        """
+        Shards of the run, in order.
+
+        Returns:
+        --------
+        list
+            Dicts with from_date and to_date narrowing the strike selection (to_date None for the last
+            shard), start, the walk state the shard starts from, and stop, the first entry minute of the
+            next shard (None for the last).
+        """
+        engine = self.engine
+        weeks = StreamingEngine(engine, chunk='week').chunks()
+        groups = [weeks[number:number + self.weeks_per_shard] for number in range(0, len(weeks), self.weeks_per_shard)]
+        last_to_date = pd.to_datetime(engine.data_fetch_para()['ToDate'])
+        shards = []
+        for number, group in enumerate(groups):
+            first_session, last_session = group[0][0], group[-1][1]
+            last_shard = number == len(groups) - 1
+            shards.append({
+                'from_date': engine.FromDate if number == 0 else str(first_session),
+                'to_date': None if last_shard else str(min(pd.to_datetime(last_session) + pd.Timedelta(days=1), last_to_date)),
+                # The ExitTime of the previous session, the walk moves on to the EntryTime of the first session
+                # like a single walk leaving the previous session
+                'start': pd.to_datetime(f'{engine.FromDate} {engine.EntryTime}') if number == 0
+                         else pd.to_datetime(f'{groups[number - 1][-1][1]} {engine.ExitTime}'),
+                'stop': None if last_shard else pd.to_datetime(f'{groups[number + 1][0][0]} {engine.EntryTime}'),
+            })
+        return shards
+
+    def _rewalk(self, leg, shard, current):
+        # Leg of shard walked in this process from where the previous shard really left it
+        vectorized = VectorizedLeg(self.engine, leg, Data=self.Data)
+        if shard['stop'] is not None and self.engine.adjust_for_next_trade(self.Data, current) >= shard['stop']:
+            # Still in a trade which exits after this shard
+            return vectorized.trade_book(TradeBookBuffer()), current
+        strikes = vectorized.select_strikes(from_date=shard['from_date'], to_date=shard['to_date'])
+        trades, resume = vectorized.walk(strikes, current, stop=shard['stop'])
+        return vectorized.trade_book(trades), resume
+
+    @staticmethod
+    def _leg_book(books):
+        # The book of a leg over all shards, as Engine.run has it. Shards without trades are left out,
+        # their empty object columns would turn the typed columns of the others into objects
+        traded = [book for book in books if not book.empty]
+        return pd.concat(traded, ignore_index=True) if traded else books[0]
+
+    def run(self):
+        """
+        Runs the shards in parallel and stitches their trade books.
+
+        Returns:
+        --------
+        pd.DataFrame
+            Trade book with Profit, CumulativeProfit and Drawdown, same as Engine.run.
+        """
+        engine = self.engine
+        shards = self.shards()
+        engine.logger.info(f'Sharded run of {len(shards)} shards on {self.max_workers} workers')
+        leg_books = [[] for _ in engine.legs]
+        resume = [None] * len(engine.legs)
+
+        with engine.profiler.stage('run') as run_stage:
+            with worker_pool(engine.logger, self.max_workers) as executor:
+                futures = [executor.submit(_run_shard, engine.Strategy_parameters, engine.db_path, engine.log_path, shard)
+                           for shard in shards]
+                for number, (shard, future) in enumerate(zip(shards, futures)):
+                    with engine.profiler.stage('shard') as stage:
+                        kept = 0
+                        for position, (leg, (book, leg_resume)) in enumerate(zip(engine.legs, future.result())):
+                            book = from_ipc(book)
+                            if number > 0:
+                                current = resume[position]
+                                if current is None:
+                                    # The leg stopped in an earlier shard, on a trade without an exit in the data
+                                    continue
+                                if engine.adjust_for_next_trade(self.Data, current) != engine.adjust_for_next_trade(self.Data, shard['start']):
+                                    engine.logger.info(f"{leg['LegName']} : trade open past {shard['from_date']}, shard walked again from {current}")
+                                    book, leg_resume = self._rewalk(leg, shard, current)
+                            leg_books[position].append(book)
+                            resume[position] = leg_resume
+                            kept += book.shape[0]
+                        stage.rows = kept
+
+            AllTradeBook = TradeBookBuffer.combine([self._leg_book(books) for books in leg_books])
+            AllTradeBook = engine.calculate_profit(AllTradeBook)
+            run_stage.rows = AllTradeBook.shape[0]
+        engine.logger.info('Sharded run completed')
+        return AllTradeBook
@@ -0,0 +1,187 @@
+import contextlib
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from OP_BackTest.core.DataFetch import DataFetcher
+from OP_BackTest.core.Vectorized import VectorizedLeg
+
+CHUNKS = ['day', 'week']
+
+# Trade book layout of Engine.run, fixed so every chunk appends to the same Parquet schema
+TRADE_SCHEMA = pa.schema([
+    ('EntryTime', pa.timestamp('ns')),
+    ('Action', pa.string()),
+    ('Ticker', pa.string()),
+    ('EntryPrice', pa.float64()),
+    ('Target', pa.float64()),
+    ('Stoploss', pa.float64()),
+    ('ExitTime', pa.timestamp('ns')),
+    ('ExitPrice', pa.float64()),
+    ('ExitReason', pa.string()),
+    ('TotalLot', pa.int64()),
+    ('LegName', pa.string()),
+    ('Profit', pa.float64()),
+    ('CumulativeProfit', pa.float64()),
+    ('Drawdown', pa.float64()),
+])
+
+
+class StreamingEngine:
+    """
+    Bounded-memory run of an Engine over a long date range.
+
+    The range is processed one trading day or one expiry week at a time. Each chunk only loads the strike
+    selection of its own sessions, tickers are fetched through the engine's IndicatorCache, which keeps
+    the warm-up history of every ticker across chunks within its budget, and the signals of tickers that
+    expired are released after each chunk. A trade still open at the end of a chunk is simulated to its
+    exit on the ticker history and the leg resumes after it in a later chunk, so the trades are the same
+    as the ones of Engine.run.
+
+    Trades are released in ExitTime order once no later trade can exit before them, with Profit,
+    CumulativeProfit and Drawdown carried over from the previous chunks.
+
+    Attributes:
+    -----------
+    engine : Engine
+        Engine holding the strategy parameters. Legs are simulated like mode='vectorized'.
+    chunk : str
+        'day' for one trading session per chunk, 'week' for the sessions up to each expiry.
+    memory_budget : int
+        Bytes the IndicatorCache of the engine may hold during the run, None to keep its own budget.
+    """
+
+    def __init__(self, engine, chunk='day', memory_budget=None):
+        if chunk not in CHUNKS:
+            raise ValueError(f"Invalid chunk: {chunk}. Allowed values are: {CHUNKS}")
+        self.engine = engine
+        self.chunk = chunk
+        self.memory_budget = memory_budget
+        self.Data = DataFetcher(db_path=engine.db_path, pool=engine.pool or None, profiler=engine.profiler)
+
+    def chunks(self):
+        """
+        Session ranges of the run.
+
+        Returns:
+        --------
+        list
+            (first session, last session) tuples of datetime.date, in order.
+        """
+        engine = self.engine
+        sessions = self.Data.calendar.sessions
+        from_day = np.datetime64(pd.to_datetime(engine.FromDate).date(), 'D')
+        to_day = np.datetime64(pd.to_datetime(engine.ToDate).date(), 'D')
+        sessions = sessions[(sessions >= from_day) & (sessions <= to_day)]
+        if sessions.shape[0] == 0:
+            return []
+
+        if self.chunk == 'day':
+            keys = np.arange(sessions.shape[0])
+        else:
+            # Sessions are grouped by the first expiry on or after them
+            expiries = self.Data.fetch_expirys(str(sessions[0]), str(sessions[-1] + np.timedelta64(31, 'D')))
+            expiries = np.unique(pd.to_datetime(expiries['Expiry']).to_numpy().astype('datetime64[D]'))
+            keys = np.searchsorted(expiries, sessions, side='left')
+
+        boundaries = np.flatnonzero(np.diff(keys)) + 1
+        return [(group[0].astype(object), group[-1].astype(object)) for group in np.split(sessions, boundaries)]
+
+    @contextlib.contextmanager
+    def _budget(self):
+        # The cache may be the caller's, its own limit is restored once the walk ends or is abandoned
+        cache = self.engine.indicator_cache
+        max_bytes = cache.max_bytes
+        if self.memory_budget is not None and max_bytes > self.memory_budget:
+            cache.max_bytes = self.memory_budget
+        try:
+            yield
+        finally:
+            cache.max_bytes = max_bytes
+
+    def trades(self):
+        """
+        Runs the strategy chunk by chunk.
+
+        Yields:
+        -------
+        pd.DataFrame
+            Trades released by a chunk, same columns as Engine.run. Chunks releasing no trade yield nothing.
+        """
+        with self._budget():
+            yield from self._walk()
+
+    def _walk(self):
+        engine = self.engine
+        legs = [VectorizedLeg(engine, leg, Data=self.Data) for leg in engine.legs]
+        start = pd.to_datetime(f'{engine.FromDate} {engine.EntryTime}')
+        resume = [start] * len(legs)
+        last_to_date = pd.to_datetime(engine.data_fetch_para()['ToDate'])
+        chunks = self.chunks()
+        pending = []
+        cumulative, peak = 0.0, None
+
+        for number, (first_session, last_session) in enumerate(chunks):
+            last_chunk = number == len(chunks) - 1
+            stop = None if last_chunk else pd.to_datetime(f'{chunks[number + 1][0]} {engine.EntryTime}')
+            from_date = engine.FromDate if number == 0 else str(first_session)
+            to_date = min(pd.to_datetime(last_session) + pd.Timedelta(days=1), last_to_date)
+
+            for position, leg in enumerate(legs):
+                current = resume[position]
+                # Done, or still in a trade which exits after this chunk
+                if current is None or (stop is not None and engine.adjust_for_next_trade(self.Data, current) >= stop):
+                    continue
+                with engine.profiler.leg(leg.leg['LegName']), engine.profiler.stage('chunk') as stage:
+                    strikes = leg.select_strikes(from_date=from_date, to_date=None if last_chunk else to_date)
+                    trades, resume[position] = leg.walk(strikes, current, stop=stop)
+                    stage.rows = len(trades)
+                if trades:
+                    pending.append(leg.trade_book(trades))
+                leg.release(resume[position] if resume[position] is not None else pd.Timestamp.max)
+
+            engine.logger.info(f'Streaming chunk {first_session} - {last_session} done, '
+                               f'indicator cache {engine.indicator_cache.nbytes} bytes')
+
+            # Every later trade enters at or after stop, so trades exiting before it are final in ExitTime order
+            book = pd.concat(pending) if pending else pd.DataFrame()
+            if book.empty:
+                pending = []
+                continue
+            if stop is None:
+                released, pending = book, []
+            else:
+                done = book['ExitTime'] < stop
+                released, pending = book[done], [book[~done]]
+            if released.empty:
+                continue
+
+            released = released.sort_values(by='ExitTime').reset_index(drop=True)
+            released['Profit'] = np.where(released['Action'] == 'BUY', (released['ExitPrice'] - released['EntryPrice']) * released['TotalLot'], (released['EntryPrice'] - released['ExitPrice']) * released['TotalLot'])
+            released['CumulativeProfit'] = released['Profit'].cumsum() + cumulative
+            running_peak = released['CumulativeProfit'].cummax()
+            if peak is not None:
+                running_peak = running_peak.clip(lower=peak)
+            released['Drawdown'] = released['CumulativeProfit'] - running_peak
+            cumulative = float(released['CumulativeProfit'].iloc[-1])
+            peak = float(running_peak.iloc[-1])
+            yield released
+
+    def to_parquet(self, path):
+        """
+        Runs the strategy and appends the trades of every chunk to the Parquet file path.
+
+        Returns:
+        --------
+        int
+            Number of trades written.
+        """
+        tmp_path = f'{path}.tmp'
+        count = 0
+        with pq.ParquetWriter(tmp_path, TRADE_SCHEMA) as writer:
+            for trades in self.trades():
+                writer.write_table(pa.Table.from_pandas(trades[TRADE_SCHEMA.names], schema=TRADE_SCHEMA, preserve_index=False))
+                count += trades.shape[0]
+        os.replace(tmp_path, path)
+        return count
@@ -0,0 +1,215 @@
+import copy
+import itertools
+import os
+import random
+import shutil
+import tempfile
+from concurrent.futures import as_completed
+import duckdb
+import pandas as pd
+from OP_BackTest.core.ArrowStore import export_table, is_arrow_path
+from OP_BackTest.core.ConnectionPool import default_pool
+from OP_BackTest.core.IndicatorCache import IndicatorCache
+from OP_BackTest.core.LegExecutor import worker_pool
+from OP_BackTest.utlis import log_handler
+
+# One indicator cache per worker process and data file, reused by every configuration the worker runs
+_worker_caches = {}
+
+
+def set_parameter(parameters, path, value):
+    """
+    Sets a nested strategy parameter addressed by a dotted path, e.g. 'Legs.0.Target.Points' or
+    'Indicator_data.ALMA280.2.0.window'. Integer parts index into lists.
+    """
+    keys = path.split('.')
+    target = parameters
+    for key in keys[:-1]:
+        target = target[int(key)] if isinstance(target, list) else target[key]
+    last = keys[-1]
+    if isinstance(target, list):
+        target[int(last)] = value
+    else:
+        target[last] = value
+
+
+def summarize(trade_book):
+    """
+    One summary row for a trade book returned by Engine.run.
+    """
+    if trade_book.empty:
+        return {'Trades': 0, 'NetProfit': 0.0, 'MaxDrawdown': 0.0, 'WinRate': None}
+    return {
+        'Trades': int(trade_book.shape[0]),
+        'NetProfit': float(trade_book['Profit'].sum()),
+        'MaxDrawdown': float(trade_book['Drawdown'].min()),
+        'WinRate': float((trade_book['Profit'] > 0).mean()),
+    }
+
+
+def _run_configuration(configuration, parameters, data_path, log_path, mode):
+    # Runs in a worker process
+    from OP_BackTest.core.Engine import Engine
+    indicator_cache = _worker_caches.setdefault(data_path, IndicatorCache())
+    row = dict(configuration)
+    try:
+        # The worker ends with the sweep, its connection is kept for the configurations it runs
+        engine = Engine(Strategy_parameters=parameters, db_path=data_path, log_path=log_path, mode=mode,
+                        indicator_cache=indicator_cache, pool=default_pool)
+        row.update(summarize(engine.run()))
+        row['Error'] = None
+    except Exception as e:
+        row['Error'] = f'{type(e).__name__}: {e}'
+    return row
+
+
+class SweepRunner:
+    """
+    Runs one strategy over many parameter configurations on a process pool.
+
+    The rows the configurations can trade (see export_query) are exported once to a memory-mapped Arrow
+    file which every worker opens zero-copy, so the workers share one copy of the market data and none
+    of them holds a DuckDB file lock. Workers are spawned (see LegExecutor.worker_pool) and their log
+    records are written to the Engine log of the parent.
+    Each worker keeps one IndicatorCache across the configurations it runs, so tickers and indicators
+    are resampled once per worker rather than once per configuration.
+
+    Attributes:
+    -----------
+    base_parameters : dict
+        Strategy_parameters every configuration starts from.
+    space : dict
+        Dotted parameter path to the list of values to try, e.g.
+        {'TimeFrame': [1, 3, 5], 'Legs.0.Target.Points': [10, 20], 'Indicator_data.ALMA280.2.0.window': [5, 9]}.
+    db_path : str
+        DuckDB database, or an `.arrow` file already exported with ArrowStore.export_table.
+    search : str
+        'grid' for every combination of the space, 'random' for n_samples random combinations.
+    max_workers : int
+        Worker processes, os.cpu_count() by default.
+    mode : str
+        Engine mode used for every run, 'vectorized' by default.
+    """
+
+    def __init__(self, base_parameters, space, db_path, log_path=None, search='grid', n_samples=None, seed=None,
+                 max_workers=None, mode='vectorized', shared_dir=None):
+        if search not in ('grid', 'random'):
+            raise ValueError(f"Invalid search: {search}. Allowed values are: ['grid', 'random']")
+        if search == 'random' and not n_samples:
+            raise ValueError("n_samples is required for random search")
+        self.base_parameters = base_parameters
+        self.space = space
+        self.db_path = db_path
+        self.log_path = log_path
+        self.search = search
+        self.n_samples = n_samples
+        self.seed = seed
+        self.max_workers = max_workers or os.cpu_count()
+        self.mode = mode
+        self.shared_dir = shared_dir
+
+        log_path = "Engine.log" if log_path is None else log_path + "Engine.log"
+        self.logger = log_handler.ThreadSafeLogger("Engine", log_path).get_logger()
+
+    def configurations(self):
+        """
+        Yields one {path: value} dict per configuration of the search space.
+        """
+        paths = list(self.space)
+        if self.search == 'grid':
+            for values in itertools.product(*(self.space[path] for path in paths)):
+                yield dict(zip(paths, values))
+        else:
+            rng = random.Random(self.seed)
+            for _ in range(self.n_samples):
+                yield {path: rng.choice(list(self.space[path])) for path in paths}
+
+    def build_parameters(self, configuration):
+        parameters = copy.deepcopy(self.base_parameters)
+        for path, value in configuration.items():
+            set_parameter(parameters, path, value)
+        return parameters
+
+    def export_query(self):
+        """
+        Query exporting the rows of the option tickers any configuration can pick, over their whole
+        history so indicators warm up as on the database, and the NIFTY minutes they span.
+
+        Strikes are picked between FromDate and ToDate from expiries ExpiryExitDate to ExpiryEntryDate
+        days ahead, which bounds the expiries of the picked tickers.
+
+        Returns:
+        --------
+        tuple
+            Query and its parameters.
+        """
+        from OP_BackTest.core.Engine import Engine
+        first_expiry, last_expiry = None, None
+        for configuration in self.configurations():
+            try:
+                engine = Engine(self.build_parameters(configuration), db_path=self.db_path, log_path=self.log_path,
+                                mode=self.mode, executor='serial')
+            except Exception:
+                # Reported as the Error of the configuration by its worker
+                continue
+            conditions = engine.data_fetch_para()
+            first = (pd.to_datetime(conditions['FromDate']) + pd.Timedelta(days=conditions['EndDaysBeforeExpiry'])).date()
+            last = (pd.to_datetime(conditions['ToDate']) + pd.Timedelta(days=conditions['StartDaysBeforeExpiry'])).date()
+            first_expiry = first if first_expiry is None else min(first_expiry, first)
+            last_expiry = last if last_expiry is None else max(last_expiry, last)
+        if first_expiry is None:
+            return "SELECT * FROM data WHERE false", []
+        query = """
+            WITH options AS (SELECT * FROM data WHERE CAST(Expiry AS DATE) BETWEEN ? AND ?)
+            SELECT * FROM options
+            UNION ALL
+            SELECT * FROM data
+            WHERE Ticker = 'NIFTY' AND DateTime >= (SELECT MIN(DateTime) FROM options) AND CAST(DateTime AS DATE) <= ?
+            ORDER BY Ticker, DateTime
+        """
+        return query, [str(first_expiry), str(last_expiry), str(last_expiry)]
+
+    def _shared_data(self):
+        # Arrow file shared by the workers and the directory to remove afterwards, if one was created
+        if is_arrow_path(self.db_path):
+            return str(self.db_path), None
+        created = None
+        shared_dir = self.shared_dir
+        if shared_dir is None:
+            shared_dir = created = tempfile.mkdtemp(prefix='sweep_')
+        data_path = os.path.join(shared_dir, 'data.arrow')
+        query, params = self.export_query()
+        conn = duckdb.connect(database=str(self.db_path), read_only=True)
+        try:
+            export_table(conn, data_path, query, params=params)
+        finally:
+            conn.close()
+        return data_path, created
+
+    def iter_results(self):
+        """
+        Runs the sweep and yields one summary row per configuration as soon as it completes.
+
+        Rows hold the configuration values, Trades, NetProfit, MaxDrawdown, WinRate and Error, which is
+        None unless the configuration raised.
+        """
+        data_path, created = self._shared_data()
+        try:
+            with worker_pool(self.logger, self.max_workers) as executor:
+                futures = [executor.submit(_run_configuration, configuration, self.build_parameters(configuration),
+                                           data_path, self.log_path, self.mode)
+                           for configuration in self.configurations()]
+                for future in as_completed(futures):
+                    yield future.result()
+        finally:
+            if created is not None:
+                shutil.rmtree(created, ignore_errors=True)
+
+    def run(self):
+        """
+        Runs the sweep and returns all summary rows, best NetProfit first.
+        """
+        results = pd.DataFrame(list(self.iter_results()))
+        if results.empty:
+            return results
+        return results.sort_values(by='NetProfit', ascending=False, na_position='last').reset_index(drop=True)
@@ -0,0 +1,100 @@
+import datetime as dt
+import numpy as np
+import pandas as pd
+
+TRADE_COLUMNS = ['EntryTime', 'Action', 'Ticker', 'EntryPrice', 'Target', 'Stoploss', 'ExitTime', 'ExitPrice', 'ExitReason', 'TotalLot']
+
+
+def _dtype(value):
+    # Column type for a trade value, numpy scalars (e.g. float32 prices) keep their own type
+    if isinstance(value, (pd.Timestamp, dt.datetime, np.datetime64)):
+        return np.dtype('datetime64[ns]')
+    if isinstance(value, np.generic):
+        return value.dtype
+    if isinstance(value, bool):
+        return np.dtype(bool)
+    if isinstance(value, int):
+        return np.dtype(np.int64)
+    if isinstance(value, float):
+        return np.dtype(np.float64)
+    return np.dtype(object)
+
+
+class TradeBookBuffer:
+    """
+    Columnar accumulator of trades.
+
+    Every column is a NumPy array typed by the first trade appended and grown by doubling, so appending
+    a trade is amortized O(1) instead of the copy made by each `DataFrame.loc[len(df)] = row`. A column
+    receiving a value of another type is promoted (e.g. int to float), or stored as objects.
+
+    Attributes:
+    -----------
+    columns : list
+        Columns of the trade book, TRADE_COLUMNS by default. Keys of a trade outside them are ignored
+        and missing keys are stored as None.
+    """
+
+    def __init__(self, columns=None, capacity=64):
+        self.columns = list(TRADE_COLUMNS if columns is None else columns)
+        self._capacity = max(int(capacity), 1)
+        self._size = 0
+        self._arrays = dict.fromkeys(self.columns)
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self):
+        self._capacity *= 2
+        for column, array in self._arrays.items():
+            if array is not None:
+                grown = np.empty(self._capacity, dtype=array.dtype)
+                grown[:self._size] = array[:self._size]
+                self._arrays[column] = grown
+
+    def _column(self, column, value):
+        array = self._arrays[column]
+        dtype = _dtype(value)
+        if array is None:
+            array = np.empty(self._capacity, dtype=dtype)
+        elif array.dtype != dtype and array.dtype != object:
+            try:
+                promoted = np.promote_types(array.dtype, dtype)
+            except TypeError:
+                promoted = np.dtype(object)
+            if promoted != array.dtype:
+                array = array.astype(promoted)
+        self._arrays[column] = array
+        return array
+
+    def append(self, trade):
+        """
+        Adds one trade, a dict keyed by column.
+        """
+        if self._size == self._capacity:
+            self._grow()
+        for column in self.columns:
+            value = trade.get(column)
+            self._column(column, value)[self._size] = value
+        self._size += 1
+
+    def extend(self, trades):
+        for trade in trades:
+            self.append(trade)
+
+    def to_frame(self):
+        """
+        Trade book as a DataFrame with the columns in order, an empty object column for a column never filled.
+        """
+        return pd.DataFrame({column: np.empty(0, dtype=object) if array is None else array[:self._size].copy()
+                             for column, array in self._arrays.items()}, columns=self.columns)
+
+    @staticmethod
+    def combine(trade_books):
+        """
+        Merges the trade books of several legs with a single concat, an empty DataFrame when there are none.
+        """
+        trade_books = list(trade_books)
+        if not trade_books:
+            return pd.DataFrame()
+        return pd.concat(trade_books)
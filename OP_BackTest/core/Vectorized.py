@@ -0,0 +1,245 @@
+import numpy as np
+import pandas as pd
+from OP_BackTest.core.DataFetch import DataFetcher
+from OP_BackTest.core.TradeBook import TradeBookBuffer
+from OP_BackTest.core.ExitIndex import ExitIndex
+
+
+class VectorizedLeg:
+    """
+    Single-pass simulator for one strategy leg.
+
+    The loop engine (Engine.leg_excution) queries the option chain, the strike history and re-computes
+    indicators for every candidate entry minute. This class loads the whole date range of the leg once:
+    the chain is fetched in one query and the strike for every minute is picked with a group-by, every
+    selected ticker is fetched and resampled once, indicators and entry/exit signals are evaluated once
+    over the full series and the remaining walk only does array lookups.
+
+    The trade book is the same as the one produced by Engine.leg_excution. Series and indicators come
+    from the engine's IndicatorCache, so both modes see the same values. Entries whose lookback slice is
+    shorter than the shifts used by the entry conditions are replayed exactly like the loop engine does.
+
+    Attributes:
+    -----------
+    engine : Engine
+        Engine holding the strategy parameters.
+    leg : dict
+        Leg parameters as created by Engine.unpack_legs.
+    Data : DataFetcher
+        Data fetcher used for all queries of the leg.
+    """
+
+    def __init__(self, engine, leg, Data=None):
+        self.engine = engine
+        self.leg = leg
+        self.Data = DataFetcher(db_path=engine.db_path, pool=engine.pool or None, profiler=engine.profiler) if Data is None else Data
+        self.series = {}
+
+    def select_strikes(self, from_date=None, to_date=None):
+        """
+        Picks the strike of every minute of the date range with one query, see DataFetcher.fetch_strikes_batch.
+
+        from_date and to_date narrow the range of the strategy, e.g. to one chunk of a streaming run.
+
+        Returns:
+        --------
+        dict
+            Mapping of DateTime to the selected Ticker.
+        """
+        data_fetch_para = self.engine.data_fetch_para()
+        data_fetch_para['Type'] = self.leg['OptionType']
+        if from_date is not None:
+            data_fetch_para['FromDate'] = str(from_date)
+        if to_date is not None:
+            data_fetch_para['ToDate'] = str(to_date)
+        rule, value = self.engine.strike_rule(self.leg['StrikePrice'])
+        with self.engine.profiler.stage('strikes') as stage:
+            Chain = self.Data if self.engine.chain_source is None else self.engine.chain_source
+            picked = Chain.fetch_strikes_batch(data_fetch_para, rule, value, column=self.engine.EntryType)
+            stage.rows = picked.shape[0]
+        return dict(zip(picked['DateTime'], picked['Ticker']))
+
+    def ticker_series(self, ticker):
+        """
+        Evaluates the entry and exit signals of one ticker once for the whole run.
+        """
+        if ticker in self.series:
+            return self.series[ticker]
+
+        with self.engine.profiler.stage('series') as stage:
+            data = self.engine.indicator_cache.series(self.Data, ticker, self.engine.TimeFrame, self.engine.Indicator_data)
+            series = {'data': data}
+            if not data.empty:
+                series['DateTime'] = data['DateTime'].to_numpy()
+                series['Close'] = data['Close'].to_numpy()
+                day_end = (data['DateTime'].dt.time == pd.to_datetime(self.engine.ExitTime).time()).to_numpy()
+                entry_conditions = self.engine.compile_conditions(self.leg['EntryConditions'], entry=True)
+                exit_conditions = self.engine.compile_conditions(self.leg['ExitConditions'])
+                series['Entry'] = entry_conditions.evaluate(data)
+                series['EntryShift'] = entry_conditions.max_shift
+                series['ExitShift'] = exit_conditions.max_shift
+                series['ExitIndex'] = ExitIndex(data['High'].to_numpy(), data['Low'].to_numpy(), exit_conditions.evaluate(data), day_end)
+            stage.rows = data.shape[0]
+        self.series[ticker] = series
+        return series
+
+    def replay_trade(self, series, start, current_trade_entry_date):
+        # Exact loop-engine evaluation on the lookback slice, used while shifted columns reach before it.
+        strike_data = series['data'].iloc[start:].reset_index(drop=True)
+        strike_data_pre = strike_data[strike_data['DateTime'] <= current_trade_entry_date]
+        strike_data_post = strike_data[strike_data['DateTime'] > current_trade_entry_date]
+
+        if strike_data_post.empty or not self.engine.check_conditions(strike_data_pre, self.leg['EntryConditions'], entry=True):
+            return None
+
+        trade_entry = self.engine.prepare_trade_entry(self.leg, strike_data_pre, current_trade_entry_date)
+        try:
+            trade_exit = self.engine.determine_trade_exit(self.leg, trade_entry, strike_data_post)
+        except IndexError:
+            trade_exit = {'ExitTime': None, 'ExitPrice': None, 'ExitReason': None}
+        return {**trade_entry, **trade_exit}
+
+    def simulate_trade(self, series, entry, current_trade_entry_date):
+        # First passage over the ticker's ExitIndex, with the same priority as Engine.determine_trade_exit.
+        leg = self.leg
+        entry_price = series['Close'][entry]
+        if leg['ActionType'] == 'BUY':
+            target = entry_price + leg['Target']['Points']
+            stoploss = entry_price - leg['Stoploss']['Points']
+        else:
+            target = entry_price - leg['Target']['Points']
+            stoploss = entry_price + leg['Stoploss']['Points']
+
+        # First bar of each exit kind after the entry, O(log n) lookups in the ExitIndex of the ticker
+        start = entry + 1
+        index = series['ExitIndex']
+        if leg['ActionType'] == 'BUY':
+            target_position = index.first_high_at_least(start, target)
+            stoploss_position = index.first_low_at_most(start, stoploss)
+        else:
+            target_position = index.first_low_at_most(start, target)
+            stoploss_position = index.first_high_at_least(start, stoploss)
+
+        # Exit conditions are evaluated on the post-entry frame only, so shifted columns are empty
+        # for the first bars after the entry. Re-evaluate those bars on the same short frame.
+        exit_position = None
+        shift = min(series['ExitShift'], index.size - start)
+        if shift:
+            head = series['data'].iloc[start:start + shift].reset_index(drop=True)
+            head_signal = self.engine.compile_conditions(leg['ExitConditions']).evaluate(head)
+            if head_signal.any():
+                exit_position = start + int(np.argmax(head_signal))
+        if exit_position is None:
+            exit_position = index.next_signal(start + shift)
+        day_end_position = index.next_day_end(start)
+
+        positions = [position for position in (stoploss_position, target_position, exit_position, day_end_position) if position is not None]
+        position = min(positions) if positions else None
+
+        if position is None:
+            reason, exit_price = None, None
+        elif stoploss_position == position:
+            reason, exit_price = 'Stoploss', stoploss
+        elif target_position == position:
+            reason, exit_price = 'Target', target
+        elif exit_position == position:
+            reason, exit_price = 'ExitCondition', series['Close'][position]
+        else:
+            reason, exit_price = 'DayEnd', series['Close'][position]
+
+        return {
+            'Ticker': series['data']['Ticker'].iloc[entry],
+            'EntryTime': current_trade_entry_date,
+            'EntryPrice': entry_price,
+            'Target': target,
+            'Stoploss': stoploss,
+            'TotalLot': leg['TotalLot'],
+            'ExitTime': None if position is None else series['data']['DateTime'].iloc[position],
+            'ExitPrice': exit_price,
+            'ExitReason': reason,
+        }
+
+    def run(self):
+        """
+        Runs the leg over the full date range.
+
+        Returns:
+        --------
+        pd.DataFrame
+            Trade book of the leg, same layout as Engine.leg_excution.
+        """
+        start = pd.to_datetime(f'{self.engine.FromDate} {self.engine.EntryTime}')
+        trades, _ = self.walk(self.select_strikes(), start)
+        return self.trade_book(trades)
+
+    def walk(self, strikes, current_trade_entry_date, stop=None):
+        """
+        Walks the entry minutes from current_trade_entry_date, the way Engine.leg_excution does.
+
+        With stop the walk pauses before the first entry minute at or after stop and can be resumed from
+        the returned minute, giving the same trades as one walk over the whole range.
+
+        Returns:
+        --------
+        tuple
+            (TradeBookBuffer of the trades, minute to resume from). The minute is None once the leg is done.
+        """
+        engine = self.engine
+        trades = TradeBookBuffer()
+        last_trade_exit_date = pd.to_datetime(f'{engine.ToDate} {engine.ExitTime}')
+        calendar = self.Data.calendar
+
+        while current_trade_entry_date < last_trade_exit_date:
+            next_trade_entry_date = engine.adjust_for_next_trade(self.Data, current_trade_entry_date)
+            if stop is not None and next_trade_entry_date >= stop:
+                return trades, current_trade_entry_date
+            current_trade_entry_date = next_trade_entry_date
+            ticker = strikes.get(current_trade_entry_date)
+            if ticker is None:
+                continue
+
+            series = self.ticker_series(ticker)
+            if series['data'].empty:
+                continue
+
+            start_time, _ = engine.calculate_time(end_time=current_trade_entry_date, calendar=calendar)
+            start = int(np.searchsorted(series['DateTime'], np.datetime64(start_time), side='left'))
+            entry = int(np.searchsorted(series['DateTime'], np.datetime64(current_trade_entry_date), side='right')) - 1
+            total = series['DateTime'].shape[0]
+
+            if total - start < engine.max_window or entry < start:
+                continue
+
+            if entry - start < series['EntryShift']:
+                with engine.profiler.stage('exit'):
+                    trade = self.replay_trade(series, start, current_trade_entry_date)
+                if trade is None:
+                    continue
+            elif entry + 1 >= total or not series['Entry'][entry]:
+                continue
+            else:
+                with engine.profiler.stage('exit'):
+                    trade = self.simulate_trade(series, entry, current_trade_entry_date)
+
+            if trade['ExitReason'] is None:
+                # No exit bar left in the data, the loop engine stops the leg at this point as well.
+                engine.logger.info(f"{self.leg['LegName']} : open trade on {trade['Ticker']} has no exit in data, leg stopped")
+                return trades, None
+            trades.append(trade)
+            current_trade_entry_date = trade['ExitTime']
+
+        return trades, None
+
+    def release(self, before):
+        """
+        Drops the signals of tickers whose data ends before `before`, no later entry can pick them.
+        """
+        for ticker in [ticker for ticker, series in self.series.items()
+                       if series['data'].empty or series['DateTime'][-1] < np.datetime64(before)]:
+            del self.series[ticker]
+
+    def trade_book(self, trades):
+        legTradeBook = trades.to_frame()
+        legTradeBook['LegName'] = self.leg['LegName']
+        legTradeBook['Action'] = self.leg['ActionType']
+        return legTradeBook
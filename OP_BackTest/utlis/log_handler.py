@@ -1,12 +1,45 @@
 import logging
 import logging.handlers
 import queue
+import os
 import threading
 
 class ThreadSafeLogger:
+    # One instance per (logname, logpath). Engines created repeatedly in one process (sweeps, batches)
+    # would otherwise add a handler and a listener thread each, and every message would be written once per Engine.
+    _instances = {}
+    _instances_lock = threading.Lock()
+    # Queue of the parent process when records are forwarded, see forward_to
+    _forward_queue = None
+
+    def __new__(cls, logname, logpath):
+        key = (logname, os.path.abspath(str(logpath)))
+        with cls._instances_lock:
+            instance = cls._instances.get(key)
+            if instance is None:
+                instance = super().__new__(cls)
+                instance._initialized = False
+                cls._instances[key] = instance
+            return instance
+
     def __init__(self, logname, logpath):
+        if self._initialized:
+            return
+        self._initialized = True
         self.logname = logname
         self.logpath = logpath
+        self.logger = logging.getLogger(self.logname)
+        self.logger.setLevel(logging.DEBUG)
+
+        if self._forward_queue is not None:
+            # Worker process: no file of its own, the parent writes the records
+            self.log_queue = self._forward_queue
+            self.queue_handler = logging.handlers.QueueHandler(self.log_queue)
+            self.file_handler = None
+            self.queue_listener = None
+            self.logger.addHandler(self.queue_handler)
+            return
+
         self.log_queue = queue.Queue()
 
         # Create a queue handler and set the formatter
@@ -21,17 +54,27 @@ class ThreadSafeLogger:
         self.queue_listener = logging.handlers.QueueListener(self.log_queue, self.file_handler)
         self.queue_listener.start()
 
-        # Create and configure the logger
-        self.logger = logging.getLogger(self.logname)
-        self.logger.setLevel(logging.DEBUG)  # Adjust the level as needed
+        # Configure the logger
         self.logger.addHandler(self.queue_handler)
 
+    @classmethod
+    def forward_to(cls, log_queue):
+        """
+        Sends the records of the loggers created afterwards in this process to log_queue instead of a
+        file, e.g. from a worker process to a QueueListener of the parent process.
+        """
+        cls._forward_queue = log_queue
+
     def get_logger(self):
         return self.logger
 
     def stop_listener(self):
-        self.queue_listener.stop()
-        self.file_handler.close()
+        if self.queue_listener is not None:
+            self.queue_listener.stop()
+            self.file_handler.close()
+        self.logger.removeHandler(self.queue_handler)
+        with self._instances_lock:
+            self._instances.pop((self.logname, os.path.abspath(str(self.logpath))), None)
 
 # Usage example
 # if __name__ == "__main__":